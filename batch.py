@@ -0,0 +1,273 @@
+"""
+Пакетный расчёт матриц для больших выгрузок дат рождения.
+
+Даты читаются потоком, кусками по --chunk-size строк; цифры считаются
+векторно в NumPy по всему куску сразу по тем же правилам, что и
+calculate_matrix / get_matrix_value. Результат пишется потоком в CSV или
+JSONL, память не зависит от размера входа. --jobs N раздаёт куски по
+процессам, сохраняя порядок строк.
+
+Каждая строка входа даёт строку результата: row — номер строки данных
+(с 1, без заголовка), --id-column переносит колонку-идентификатор как есть.
+Некорректные даты не отбрасываются, а пишутся с error=invalid_date и
+пустыми цифрами. Как и бот (strptime), даты без ведущих нулей вида
+1.5.1990 принимаются и в результате приводятся к 01.05.1990.
+
+    python batch.py birthdates.csv --column birthdate --id-column user_id -o matrices.csv --jobs 4
+"""
+import argparse
+import csv
+import io
+import json
+import re
+import sys
+from collections import deque
+from itertools import islice
+from multiprocessing import Pool
+
+import numpy as np
+
+from matrix import matrix_key
+
+COLUMNS = ["date", "error", "first", "second", "third", "fourth"] + [f"c{n}" for n in range(1, 10)]
+INVALID_DATE = "invalid_date"
+
+_DIGIT_POSITIONS = [0, 1, 3, 4, 6, 7, 8, 9]
+_DAYS_IN_MONTH = np.array([0, 31, 29, 31, 30, 31, 30, 31, 31, 30, 31, 30, 31])
+_SHORT_DATE = re.compile(r"(\d{1,2})\.(\d{1,2})\.(\d{4})")
+
+# Ключи values.matrix для каждой цифры и количества (как в get_matrix_value)
+_KEYS = np.array([[matrix_key(n, count) for count in range(16)] for n in range(1, 10)], dtype=object)
+
+
+def _reduce(numbers):
+    remainder = numbers % 9
+    return np.where(remainder == 0, 9, remainder)
+
+
+def _pad(date: str) -> str:
+    match = _SHORT_DATE.fullmatch(date)
+    if match is None:
+        return date
+    day, month, year = match.groups()
+    return f"{day:0>2}.{month:0>2}.{year}"
+
+
+def compute_chunk(dates: list) -> dict:
+    """
+    Матрицы для списка строк ДД.ММ.ГГГГ; valid отмечает корректные даты,
+    цифры некорректных не имеют смысла
+    """
+    dates = [d.strip() for d in dates]
+    # Д.М.ГГГГ дополняем нулями; строки нужной длины не трогаем
+    dates = [d if len(d) == 10 else _pad(d) for d in dates]
+    # Длину проверяем до приведения к U10, которое обрезает длинные строки
+    lengths = np.fromiter(map(len, dates), dtype=np.int32, count=len(dates))
+    text = np.array(dates, dtype="U10")
+    codes = text.view(np.uint32).reshape(len(text), 10).astype(np.int32)
+
+    digits = codes[:, _DIGIT_POSITIONS] - ord("0")
+    valid = (
+        (lengths == 10)
+        & (codes[:, 2] == ord("."))
+        & (codes[:, 5] == ord("."))
+        & ((digits >= 0) & (digits <= 9)).all(axis=1)
+    )
+
+    day = digits[:, 0] * 10 + digits[:, 1]
+    month = digits[:, 2] * 10 + digits[:, 3]
+    year = digits[:, 4] * 1000 + digits[:, 5] * 100 + digits[:, 6] * 10 + digits[:, 7]
+    leap = (year % 4 == 0) & ((year % 100 != 0) | (year % 400 == 0))
+    month_days = _DAYS_IN_MONTH[np.clip(month, 0, 12)] - ((month == 2) & ~leap)
+    valid &= (month >= 1) & (month <= 12) & (day >= 1) & (day <= month_days) & (year >= 1)
+
+    # Мусор в некорректных строках не должен давать отрицательных цифр
+    digits = np.where(valid[:, None], digits, 0)
+
+    first = digits.sum(axis=1)
+    second = _reduce(first)
+    # Первая ненулевая цифра дня
+    day_digit = np.where(digits[:, 0] > 0, digits[:, 0], digits[:, 1])
+    third = np.abs(first - 2 * day_digit)
+    fourth = _reduce(third)
+
+    # Нули в старших разрядах не влияют: считаются только цифры 1–9
+    full = np.column_stack([digits, first // 10, first % 10, second, third // 10, third % 10, fourth])
+    counts = (full[:, :, None] == np.arange(1, 10)).sum(axis=1)
+
+    return {
+        "date": dates,
+        "first": first,
+        "second": second,
+        "third": third,
+        "fourth": fourth,
+        "counts": counts,
+        "valid": valid,
+        "invalid": int(len(valid) - valid.sum()),
+    }
+
+
+def matrix_keys(counts) -> np.ndarray:
+    """
+    Ключи values.matrix для каждой цифры: массив (n, 9)
+    """
+    return _KEYS[np.arange(9), np.clip(counts, 0, 15)]
+
+
+def format_chunk(result: dict, rows: list, ids, fmt: str, keys: bool) -> str:
+    """
+    Строки результата куска: rows — номера строк входа, ids — значения
+    --id-column или None
+    """
+    numbers = np.column_stack([result["first"], result["second"], result["third"], result["fourth"], result["counts"]])
+    numbers = numbers.tolist()
+    valid = result["valid"].tolist()
+    key_rows = matrix_keys(result["counts"]).tolist() if keys else None
+    if ids is None:
+        ids = [None] * len(rows)
+    out = io.StringIO()
+
+    if fmt == "jsonl":
+        for i, (row, id_value, date, ok, values) in enumerate(zip(rows, ids, result["date"], valid, numbers)):
+            record = {"row": row}
+            if id_value is not None:
+                record["id"] = id_value
+            record["date"] = date
+            if ok:
+                record.update(first=values[0], second=values[1], third=values[2], fourth=values[3],
+                              counts=values[4:])
+                if keys:
+                    record["keys"] = key_rows[i]
+            else:
+                record["error"] = INVALID_DATE
+            out.write(json.dumps(record, ensure_ascii=False))
+            out.write("\n")
+    else:
+        writer = csv.writer(out, lineterminator="\n")
+        empty = [""] * (len(COLUMNS) - 2 + (9 if keys else 0))
+        for i, (row, id_value, date, ok, values) in enumerate(zip(rows, ids, result["date"], valid, numbers)):
+            prefix = [row, date] if id_value is None else [row, id_value, date]
+            if not ok:
+                writer.writerow(prefix + [INVALID_DATE] + empty)
+            elif keys:
+                writer.writerow(prefix + [""] + values + key_rows[i])
+            else:
+                writer.writerow(prefix + [""] + values)
+
+    return out.getvalue()
+
+
+def process_chunk(args) -> tuple:
+    first_row, dates, ids, fmt, keys = args
+    result = compute_chunk(dates)
+    rows = range(first_row, first_row + len(dates))
+    return format_chunk(result, rows, ids, fmt, keys), len(dates), result["invalid"]
+
+
+def _column_index(column, names: list) -> int:
+    if column.isdigit():
+        return int(column)
+    return names.index(column)
+
+
+def read_dates(f, column, header: bool, chunk_size: int, id_column=None):
+    """
+    Куски (номер первой строки, даты, идентификаторы или None) по chunk_size
+    строк CSV. Возвращает имя колонки-идентификатора и генератор кусков
+    """
+    reader = csv.reader(f)
+    names = next(reader, []) if header else []
+    index = _column_index(column, names) if column is not None else 0
+    id_index = _column_index(id_column, names) if id_column is not None else None
+    if id_index is None:
+        id_name = None
+    elif id_index < len(names):
+        id_name = names[id_index]
+    else:
+        id_name = "id"
+
+    def chunks():
+        first_row = 1
+        while True:
+            rows = list(islice(reader, chunk_size))
+            if not rows:
+                return
+            dates = [row[index] if len(row) > index else "" for row in rows]
+            ids = None
+            if id_index is not None:
+                ids = [row[id_index] if len(row) > id_index else "" for row in rows]
+            yield first_row, dates, ids
+            first_row += len(rows)
+
+    return id_name, chunks()
+
+
+def run(f, out, column=None, header=True, fmt="csv", keys=False, chunk_size=100_000, jobs=1,
+        id_column=None) -> tuple:
+    """
+    Возвращает (число строк входа, число некорректных дат)
+    """
+    id_name, chunks = read_dates(f, column, header, chunk_size, id_column)
+    if fmt == "csv":
+        columns = ["row"] + ([id_name] if id_name is not None else []) + COLUMNS
+        columns += [f"key{n}" for n in range(1, 10)] if keys else []
+        csv.writer(out, lineterminator="\n").writerow(columns)
+
+    tasks = ((first_row, dates, ids, fmt, keys) for first_row, dates, ids in chunks)
+    total = invalid = 0
+
+    if jobs <= 1:
+        for text, rows, bad in map(process_chunk, tasks):
+            out.write(text)
+            total += rows
+            invalid += bad
+        return total, invalid
+
+    # Не больше 2 кусков на процесс в работе: память остаётся постоянной
+    with Pool(jobs) as pool:
+        pending = deque()
+        for task in tasks:
+            pending.append(pool.apply_async(process_chunk, (task,)))
+            if len(pending) >= 2 * jobs:
+                text, rows, bad = pending.popleft().get()
+                out.write(text)
+                total += rows
+                invalid += bad
+        while pending:
+            text, rows, bad = pending.popleft().get()
+            out.write(text)
+            total += rows
+            invalid += bad
+
+    return total, invalid
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Пакетный расчёт матриц судьбы")
+    parser.add_argument("input", help="CSV с датами ДД.ММ.ГГГГ или Д.М.ГГГГ ('-' — stdin)")
+    parser.add_argument("-o", "--output", default="-", help="файл результата ('-' — stdout)")
+    parser.add_argument("--column", help="имя или номер колонки с датой (по умолчанию первая)")
+    parser.add_argument("--id-column", help="имя или номер колонки-идентификатора, переносится в результат")
+    parser.add_argument("--no-header", action="store_true", help="во входном файле нет строки заголовка")
+    parser.add_argument("--format", choices=["csv", "jsonl"], default="csv")
+    parser.add_argument("--keys", action="store_true", help="добавить ключи values.matrix для цифр 1–9")
+    parser.add_argument("--chunk-size", type=int, default=100_000)
+    parser.add_argument("--jobs", type=int, default=1, help="число процессов")
+    args = parser.parse_args(argv)
+
+    f = sys.stdin if args.input == "-" else open(args.input, newline="", encoding="utf-8")
+    out = sys.stdout if args.output == "-" else open(args.output, "w", newline="", encoding="utf-8")
+    try:
+        total, invalid = run(f, out, args.column, not args.no_header, args.format,
+                             args.keys, args.chunk_size, args.jobs, args.id_column)
+    finally:
+        if f is not sys.stdin:
+            f.close()
+        if out is not sys.stdout:
+            out.close()
+
+    print(f"Обработано строк: {total}, некорректных дат: {invalid}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
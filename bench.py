@@ -0,0 +1,243 @@
+"""
+Микробенчмарки горячих путей: расчёт матрицы, рендер текстов, handle_date,
+inline-ответы.
+
+Каждый путь прогоняется на фиксированных наборах дат (uniform — равномерно
+по 1900–2100, skewed — популярные даты, repeated — даты с максимальными
+повторами цифр). Результат — лучшее время на операцию из --repeat прогонов.
+
+    python bench.py --save bench_baseline.json
+    python bench.py --compare bench_baseline.json --threshold 0.2
+
+В режиме сравнения код выхода 1, если какой-то путь стал медленнее порога.
+"""
+import argparse
+import atexit
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+from concurrent.futures import Future
+from datetime import date, timedelta
+
+import horoscope
+import matrix
+from matrix_index import FIRST_DATE, LAST_DATE, get_index
+
+SEED = 20240101
+
+
+def _fmt(day: date) -> str:
+    return day.strftime("%d.%m.%Y")
+
+
+def uniform_corpus(size: int) -> list:
+    rng = random.Random(SEED)
+    span = (LAST_DATE - FIRST_DATE).days
+    return [_fmt(FIRST_DATE + timedelta(days=rng.randrange(span + 1))) for _ in range(size)]
+
+
+def skewed_corpus(size: int) -> list:
+    # 80% запросов приходятся на 100 популярных дат 1970–2000
+    rng = random.Random(SEED + 1)
+    start, span = date(1970, 1, 1), (date(2000, 12, 31) - date(1970, 1, 1)).days
+    popular = [_fmt(start + timedelta(days=rng.randrange(span + 1))) for _ in range(100)]
+    return [
+        rng.choice(popular) if rng.random() < 0.8 else _fmt(start + timedelta(days=rng.randrange(span + 1)))
+        for _ in range(size)
+    ]
+
+
+def repeated_corpus(size: int) -> list:
+    # Даты, где одна цифра встречается чаще всего (длинные ключи values.matrix)
+    counts = get_index().count_vectors()
+    worst = sorted(counts, key=max, reverse=True)[:50]
+    days = [day for vector in worst for day in get_index().dates_with_counts(vector)]
+    rng = random.Random(SEED + 2)
+    return [_fmt(rng.choice(days)) for _ in range(size)]
+
+
+CORPORA = {
+    "uniform": uniform_corpus,
+    "skewed": skewed_corpus,
+    "repeated": repeated_corpus,
+}
+
+
+class StubBot:
+    """
+    Заглушка TeleBot и SendScheduler: ответы никуда не отправляются,
+    отправки сразу возвращают выполненный Future
+    """
+
+    def __init__(self):
+        self.sent = 0
+
+    def _sent(self) -> Future:
+        self.sent += 1
+        future = Future()
+        future.set_result(None)
+        return future
+
+    def reply_to(self, message, text, **kwargs):
+        return self._sent()
+
+    def send_message(self, chat_id, text, **kwargs):
+        return self._sent()
+
+    def send_photo(self, chat_id, photo, caption=None, **kwargs):
+        return self._sent()
+
+    def answer_inline_query(self, inline_query_id, results, **kwargs):
+        self.sent += 1
+
+
+class _Chat:
+    def __init__(self, chat_id):
+        self.id = chat_id
+
+
+class _Message:
+    def __init__(self, chat_id, text):
+        self.chat = _Chat(chat_id)
+        self.text = text
+
+
+class _InlineQuery:
+    def __init__(self, query_id, query):
+        self.id = str(query_id)
+        self.query = query
+
+
+def _load_main():
+    if "main" in sys.modules:
+        return sys.modules["main"]
+    os.environ.setdefault("BOT_TOKEN", "0:bench")
+    os.environ["BOT_WORKERS"] = "0"
+    # main при импорте открывает базу подписчиков и кэш картинки — во временном
+    # каталоге, как в loadgen.py, а не в текущем
+    workdir = tempfile.mkdtemp(prefix="bench-")
+    atexit.register(shutil.rmtree, workdir, ignore_errors=True)
+    os.environ["SUBSCRIBERS_DB"] = os.path.join(workdir, "subscribers.db")
+    os.environ["IMAGE_CACHE_DIR"] = os.path.join(workdir, "cache")
+    import main
+
+    main.bot = StubBot()
+    # Отправка синхронно в заглушку, без лимитов SendScheduler; его потоки не нужны
+    main.sender.shutdown()
+    main.sender = main.bot
+    # Картинка «уже загружена» — в замер не попадает сеть
+    main.image_delivery._file_id = "bench"
+    return main
+
+
+def benchmarks(corpus: list) -> dict:
+    """
+    Пары «имя → функция над одним элементом корпуса»
+    """
+    data = {date_str: matrix.calculate_matrix(date_str) for date_str in corpus}
+    today = time.localtime()
+    day = date(today.tm_year, today.tm_mon, today.tm_mday)
+    main = _load_main()
+    messages = {date_str: _Message(i, date_str) for i, date_str in enumerate(corpus)}
+    queries = {date_str: _InlineQuery(i, date_str) for i, date_str in enumerate(corpus)}
+
+    paths = {
+        "calculate_matrix": matrix.calculate_matrix,
+        "matrix_index.matrix_data": main.matrix_index.matrix_data,
+        "matrix_index.view": main.matrix_index.view,
+        "main.handle_date": lambda s: main.handle_date(messages[s]),
+        "daily_cache.get": lambda s: main.daily_cache.get(data[s]),
+        "main.handle_inline": lambda s: main.handle_inline(queries[s]),
+        # Набор даты по символу: все префиксы, кроме полной даты
+        "inline_answers.answer[partial]": lambda s: [main.inline_answers.answer(s[:n]) for n in range(len(s))],
+    }
+    for module in (horoscope, matrix):
+        name = module.__name__
+        paths.update({
+            f"{name}.get_matrix_value": lambda s, m=module: [m.get_matrix_value(data[s]["full"], n) for n in range(1, 10)],
+            f"{name}.build_matrix_text": lambda s, m=module: m.build_matrix_text(data[s]),
+            f"{name}.build_tasks_text": lambda s, m=module: m.build_tasks_text(data[s]),
+            f"{name}.render_matrix_text": lambda s, m=module: m._render_matrix_text(data[s]["counts"]),
+            f"{name}.daily_horoscope": lambda s, m=module: m.daily_horoscope(data[s], day),
+        })
+    return paths
+
+
+def measure(func, corpus: list, repeat: int) -> float:
+    """
+    Лучшее время одной операции (нс) из repeat проходов по корпусу
+    """
+    for item in corpus[:100]:
+        func(item)
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter_ns()
+        for item in corpus:
+            func(item)
+        best = min(best, (time.perf_counter_ns() - start) / len(corpus))
+    return best
+
+
+def run(size: int, repeat: int, only: str = None) -> dict:
+    results = {}
+    for corpus_name, make in CORPORA.items():
+        corpus = make(size)
+        for path, func in benchmarks(corpus).items():
+            key = f"{path}[{corpus_name}]"
+            if only and only not in key:
+                continue
+            results[key] = measure(func, corpus, repeat)
+            print(f"{key:55} {results[key] / 1000:10.2f} мкс")
+    return results
+
+
+def compare(results: dict, baseline: dict, threshold: float) -> list:
+    """
+    Пути, ставшие медленнее базового замера больше чем на threshold
+    """
+    regressions = []
+    for key, value in sorted(results.items()):
+        base = baseline.get(key)
+        if not base:
+            continue
+        change = value / base - 1
+        mark = "РЕГРЕССИЯ" if change > threshold else ""
+        print(f"{key:55} {base / 1000:10.2f} → {value / 1000:10.2f} мкс  {change:+7.1%} {mark}")
+        if change > threshold:
+            regressions.append(key)
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Бенчмарки горячих путей бота")
+    parser.add_argument("--size", type=int, default=2000, help="размер каждого корпуса")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--filter", help="только пути, содержащие подстроку")
+    parser.add_argument("--save", metavar="FILE", help="сохранить результат как базовый")
+    parser.add_argument("--compare", metavar="FILE", help="сравнить с базовым результатом")
+    parser.add_argument("--threshold", type=float, default=0.2, help="допустимое замедление (0.2 = 20%%)")
+    args = parser.parse_args(argv)
+
+    results = run(args.size, args.repeat, args.filter)
+
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+        print(f"Базовый результат сохранён: {args.save}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print(f"Регрессии ({len(regressions)}): {', '.join(regressions)}")
+            sys.exit(1)
+        print("Регрессий нет")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+"""
+Ежедневная рассылка гороскопа подписчикам.
+
+Раз в interval секунд для каждого часового пояса подписчиков проверяется,
+наступило ли местное утро (BROADCAST_HOUR). Тексты берутся из таблицы
+вариантов дня DailyHoroscopeCache по (second, fourth), без расчёта матрицы.
+Подписчики читаются пачками, шарды по chat_id обрабатываются параллельно.
+Отметка last_sent ставится только после успешной отправки. После
+временной ошибки подписчик возвращается в очередь следующего запуска, но не
+больше max_attempts раз за день. 403 и 400 (бот заблокирован, чат не
+найден) — постоянные ошибки: подписка снимается. Пояс, где рассылка за день
+закончена, проверяется одним запросом по индексу, без обхода подписчиков.
+"""
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
+from datetime import datetime
+from functools import partial
+
+import pytz
+from telebot.apihelper import ApiTelegramException
+
+logger = logging.getLogger(__name__)
+
+BROADCAST_HOUR = int(os.getenv("BROADCAST_HOUR", "9"))
+
+_FIRST_CHAT_ID = -(2 ** 63)
+
+
+class BroadcastScheduler:
+    def __init__(self, store, sender, daily_cache, hour: int = BROADCAST_HOUR,
+                 batch_size: int = 500, shards: int = 4, interval: float = 60, max_attempts: int = 3):
+        self.store = store
+        self.sender = sender
+        self.daily_cache = daily_cache
+        self.hour = hour
+        self.batch_size = batch_size
+        self.shards = shards
+        self.interval = interval
+        self.max_attempts = max_attempts
+        self._tables = {}
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _texts(self, day) -> dict:
+        texts = self._tables.get(day)
+        if texts is None:
+            texts = self._tables[day] = self.daily_cache.table_for(day)
+            # Нужны максимум «вчера», «сегодня» и «завтра» в разных поясах
+            for old in sorted(self._tables)[:-3]:
+                del self._tables[old]
+        return texts
+
+    def run_once(self, now: datetime = None) -> int:
+        now = now or datetime.now(pytz.utc)
+        sent = 0
+        for timezone in self.store.timezones():
+            local = now.astimezone(pytz.timezone(timezone))
+            if local.hour >= self.hour:
+                sent += self.broadcast(timezone, local.date())
+        return sent
+
+    def broadcast(self, timezone: str, day) -> int:
+        if not self.store.has_pending(timezone, day.isoformat(), self.max_attempts):
+            return 0
+        texts = self._texts(day)
+        with ThreadPoolExecutor(max_workers=self.shards, thread_name_prefix="broadcast") as pool:
+            shards = [pool.submit(self._run_shard, timezone, day, texts, shard) for shard in range(self.shards)]
+        sent = sum(shard.result() for shard in shards)
+        if sent:
+            logger.info(f"Рассылка {day} ({timezone}): отправлено {sent}")
+        return sent
+
+    def _run_shard(self, timezone: str, day, texts: dict, shard: int) -> int:
+        sent = 0
+        after = _FIRST_CHAT_ID
+        while not self._stop.is_set():
+            batch = self.store.claim_batch(timezone, day.isoformat(), after, self.batch_size, shard, self.shards,
+                                           max_attempts=self.max_attempts)
+            if not batch:
+                break
+
+            futures = {}
+            for chat_id, second, fourth in batch:
+                future = self.sender.send_message(chat_id, texts[(second, fourth)])
+                # Отправку отмечаем сразу: после падения повтор грозит лишь тем, кто был в полёте
+                future.add_done_callback(partial(self._record, chat_id, day.isoformat()))
+                futures[future] = chat_id
+            # Следующую пачку берём, когда эта ушла: очередь отправки не растёт
+            wait(futures)
+            failed = []
+            for future, chat_id in futures.items():
+                error = future.exception()
+                if error is None:
+                    sent += 1
+                elif isinstance(error, ApiTelegramException) and error.error_code in (400, 403):
+                    # Бот заблокирован пользователем или чата больше нет: повтор не поможет
+                    logger.warning(f"Подписка чата {chat_id} снята: {error.description}")
+                    self.store.unsubscribe(chat_id)
+                else:
+                    failed.append(chat_id)
+            # Сеть, 5xx, 429 после всех повторов — попробуем при следующем запуске
+            self.store.release(failed, day.isoformat())
+            after = batch[-1][0]
+        return sent
+
+    def _record(self, chat_id: int, day: str, future):
+        if future.exception() is None:
+            try:
+                self.store.mark_sent([chat_id], day)
+            except Exception as e:
+                logger.error(f"Не удалось отметить отправку в чат {chat_id}: {e}")
+
+    def _loop(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.run_once()
+            except Exception as e:
+                logger.error(f"Ошибка рассылки: {e}")
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._loop, name="broadcast", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
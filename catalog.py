@@ -0,0 +1,212 @@
+"""
+Скомпилированный каталог текстов.
+
+Тексты из values.py и matrix_values.py собираются в один бинарный файл,
+который открывается через mmap: страницы файла общие для всех процессов,
+а строка декодируется только при первом обращении к ней.
+
+Формат (little-endian):
+    заголовок  b"MBTC", версия u16, число записей u32
+    индекс     на запись: смещение ключа u32, длина ключа u16,
+               смещение текста u32, длина текста u32; записи отсортированы
+               по UTF-8 ключа, поиск — двоичный прямо по mmap
+    данные     UTF-8 ключей и текстов
+
+Ключи плоские: "matrix/111", "tasks/1", "matrix_values/1/female".
+Сборка вручную: python catalog.py build [путь]
+"""
+import mmap
+import os
+import struct
+import sys
+import tempfile
+from collections.abc import Mapping
+
+MAGIC = b"MBTC"
+VERSION = 1
+
+_HEADER = struct.Struct("<4sHI")
+_ENTRY = struct.Struct("<IHII")
+
+_HERE = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_PATH = os.getenv("TEXT_CATALOG_PATH", os.path.join(_HERE, "texts.cat"))
+SOURCES = [os.path.join(_HERE, "values.py"), os.path.join(_HERE, "matrix_values.py")]
+
+
+def _flatten(prefix: str, value, out: dict):
+    if isinstance(value, dict):
+        for key, item in value.items():
+            _flatten(f"{prefix}/{key}", item, out)
+    else:
+        out[prefix] = value
+
+
+def collect_texts() -> dict:
+    """
+    Все тексты исходных модулей в виде плоского словаря ключ → строка
+    """
+    from values import matrix, tasks
+    from matrix_values import MATRIX_VALUES
+
+    texts = {}
+    _flatten("matrix", matrix, texts)
+    _flatten("tasks", tasks, texts)
+    _flatten("matrix_values", MATRIX_VALUES, texts)
+    return texts
+
+
+def build(path: str = DEFAULT_PATH, texts: dict = None):
+    texts = collect_texts() if texts is None else texts
+    items = sorted((key.encode("utf-8"), value.encode("utf-8")) for key, value in texts.items())
+
+    data_start = _HEADER.size + _ENTRY.size * len(items)
+    index, blobs = [], []
+    offset = data_start
+    for key, value in items:
+        index.append(_ENTRY.pack(offset, len(key), offset + len(key), len(value)))
+        blobs.append(key)
+        blobs.append(value)
+        offset += len(key) + len(value)
+
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(_HEADER.pack(MAGIC, VERSION, len(items)))
+        f.writelines(index)
+        f.writelines(blobs)
+    # Атомарная замена: параллельно стартующие процессы не увидят полфайла
+    os.replace(tmp_path, path)
+
+
+class TextCatalog:
+    def __init__(self, path: str):
+        with open(path, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, version, count = _HEADER.unpack_from(self._mmap, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{path}: не каталог текстов версии {VERSION}")
+
+        # Индекс не копируется в память процесса: ключи ищутся двоичным поиском
+        # по отсортированной таблице записей в mmap, тексты декодируются по запросу
+        self._count = count
+        self._decoded = {}
+
+    def _entry(self, i: int) -> tuple:
+        return _ENTRY.unpack_from(self._mmap, _HEADER.size + i * _ENTRY.size)
+
+    def _key(self, i: int) -> bytes:
+        key_offset, key_len, _, _ = self._entry(i)
+        return self._mmap[key_offset:key_offset + key_len]
+
+    def _lower_bound(self, key: bytes) -> int:
+        # Первая запись с ключом >= key (build пишет записи по возрастанию UTF-8)
+        lo, hi = 0, self._count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._key(mid) < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def _find(self, key: str) -> int:
+        encoded = key.encode("utf-8")
+        i = self._lower_bound(encoded)
+        return i if i < self._count and self._key(i) == encoded else -1
+
+    def __len__(self):
+        return self._count
+
+    def __contains__(self, key: str):
+        return key in self._decoded or self._find(key) >= 0
+
+    def get(self, key: str, default=None):
+        text = self._decoded.get(key)
+        if text is None:
+            i = self._find(key)
+            if i < 0:
+                return default
+            _, _, offset, length = self._entry(i)
+            text = self._decoded[key] = self._mmap[offset:offset + length].decode("utf-8")
+        return text
+
+    def keys(self, prefix: str = ""):
+        encoded = prefix.encode("utf-8")
+        keys = []
+        for i in range(self._lower_bound(encoded), self._count):
+            key = self._key(i)
+            if not key.startswith(encoded):
+                break
+            keys.append(key.decode("utf-8"))
+        return keys
+
+    def section(self, name: str) -> "CatalogSection":
+        return CatalogSection(self, name)
+
+
+class CatalogSection(Mapping):
+    """
+    Раздел каталога с интерфейсом словаря: catalog.section("matrix")["111"]
+    """
+
+    def __init__(self, catalog: TextCatalog, name: str):
+        self._catalog = catalog
+        self._prefix = f"{name}/"
+
+    def get(self, key, default=None):
+        return self._catalog.get(self._prefix + key, default)
+
+    def __getitem__(self, key):
+        text = self._catalog.get(self._prefix + key)
+        if text is None:
+            raise KeyError(key)
+        return text
+
+    def __contains__(self, key):
+        return self._prefix + key in self._catalog
+
+    def __iter__(self):
+        start = len(self._prefix)
+        return (key[start:] for key in self._catalog.keys(self._prefix))
+
+    def __len__(self):
+        return len(self._catalog.keys(self._prefix))
+
+
+def _is_stale(path: str) -> bool:
+    if not os.path.exists(path):
+        return True
+    built = os.path.getmtime(path)
+    return any(os.path.exists(source) and os.path.getmtime(source) > built for source in SOURCES)
+
+
+def open_catalog(path: str = DEFAULT_PATH) -> TextCatalog:
+    """
+    Открывает каталог, пересобирая его, если файла нет или исходники новее
+    """
+    if _is_stale(path):
+        try:
+            build(path)
+        except OSError:
+            # Каталог рядом с кодом недоступен для записи — собираем во временный
+            path = os.path.join(tempfile.gettempdir(), f"mysticbot-{os.getuid()}-texts.cat")
+            if _is_stale(path):
+                build(path)
+    return TextCatalog(path)
+
+
+catalog = open_catalog()
+
+matrix = catalog.section("matrix")
+tasks = catalog.section("tasks")
+matrix_values = catalog.section("matrix_values")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2 or sys.argv[1] != "build":
+        print("Использование: python catalog.py build [путь]")
+        sys.exit(1)
+
+    target = sys.argv[2] if len(sys.argv) > 2 else DEFAULT_PATH
+    build(target)
+    print(f"Каталог собран: {target} ({len(TextCatalog(target))} текстов)")
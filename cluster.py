@@ -0,0 +1,275 @@
+"""
+Многопроцессный режим: диспетчер и N рабочих процессов.
+
+Диспетчер получает обновления (polling или webhook) и раскладывает их по
+процессам по chat_id, так что сообщения одного чата обрабатываются по
+порядку. Готовые тексты build_*_text лежат в SharedRenderCache — общей
+памяти, куда блок, посчитанный одним процессом, попадает для всех.
+Супервизор перезапускает процессы, которые упали или перестали продвигаться.
+Метрики каждого процесса отдаются на отдельном порту (METRICS_PORT + 1 + номер).
+
+Рабочие процессы запускаются методом spawn: они заново импортируют главный
+модуль бота (main.py) и обрабатывают обновления его же обработчиками.
+"""
+import hashlib
+import logging
+import multiprocessing
+import os
+import queue
+import signal
+import struct
+import sys
+import threading
+import time
+from multiprocessing import shared_memory
+
+import telebot
+
+import metrics
+import render_cache
+from dispatcher import update_chat_id
+
+logger = logging.getLogger(__name__)
+
+# Блокировку мог унести убитый процесс — тогда кэш просто пропускается
+LOCK_TIMEOUT = 0.1
+
+# Заголовок слота: хэш ключа u64, длина ключа u32, длина текста u32
+_SLOT_HEADER = struct.Struct("<QII")
+
+
+class SharedRenderCache:
+    """
+    Кэш с прямой адресацией в shared memory: ключ попадает в слот hash % slots,
+    при коллизии слот перезаписывается. Доступ к слотам — под полосами блокировок;
+    ключ хранится целиком, так что коллизия хэшей даёт промах, а не чужой текст
+    """
+
+    def __init__(self, name: str, slots: int, slot_size: int, locks, create: bool = False):
+        self.slots = slots
+        self.slot_size = slot_size
+        self.locks = locks
+        self._shm = shared_memory.SharedMemory(name=name, create=create, size=slots * slot_size if create else 0)
+        self._buf = self._shm.buf
+
+    @classmethod
+    def create(cls, context, slots: int = 2048, slot_size: int = 16 * 1024, stripes: int = 16):
+        locks = [context.Lock() for _ in range(stripes)]
+        return cls(None, slots, slot_size, locks, create=True)
+
+    @property
+    def name(self) -> str:
+        return self._shm.name
+
+    def handle(self) -> tuple:
+        """
+        Аргументы для подключения к кэшу из другого процесса
+        """
+        return self.name, self.slots, self.slot_size, self.locks
+
+    @staticmethod
+    def _key(name: str, key) -> tuple:
+        raw = f"{name}:{key!r}".encode("utf-8")
+        digest = int.from_bytes(hashlib.blake2b(raw, digest_size=8).digest(), "little")
+        return raw, digest
+
+    def get(self, name: str, key):
+        raw, digest = self._key(name, key)
+        slot = digest % self.slots
+        offset = slot * self.slot_size
+        lock = self.locks[slot % len(self.locks)]
+        if not lock.acquire(timeout=LOCK_TIMEOUT):
+            return None
+        try:
+            stored, key_len, value_len = _SLOT_HEADER.unpack_from(self._buf, offset)
+            start = offset + _SLOT_HEADER.size
+            if stored != digest or key_len != len(raw) or bytes(self._buf[start:start + key_len]) != raw:
+                return None
+            value = bytes(self._buf[start + key_len:start + key_len + value_len])
+        finally:
+            lock.release()
+        return value.decode("utf-8")
+
+    def put(self, name: str, key, text: str):
+        raw, digest = self._key(name, key)
+        value = text.encode("utf-8")
+        if _SLOT_HEADER.size + len(raw) + len(value) > self.slot_size:
+            return
+        slot = digest % self.slots
+        offset = slot * self.slot_size
+        start = offset + _SLOT_HEADER.size
+        lock = self.locks[slot % len(self.locks)]
+        if not lock.acquire(timeout=LOCK_TIMEOUT):
+            return
+        try:
+            self._buf[start:start + len(raw)] = raw
+            self._buf[start + len(raw):start + len(raw) + len(value)] = value
+            _SLOT_HEADER.pack_into(self._buf, offset, digest, len(raw), len(value))
+        finally:
+            lock.release()
+
+    def close(self, unlink: bool = False):
+        self._buf.release()
+        self._shm.close()
+        if unlink:
+            self._shm.unlink()
+
+
+def _bot_module():
+    # При spawn главный модуль родителя уже импортирован как __mp_main__
+    module = sys.modules.get("__mp_main__")
+    if module is None or not hasattr(module, "bot"):
+        import main as module
+    return module
+
+
+def _liveness(heartbeat, state: dict, bot):
+    """
+    Отметка «жив»: процесс простаивает на пустой очереди или продвигается.
+    Цикл, ждущий места в очередях своих потоков (нормальное обратное давление),
+    живым считается, пока эти потоки дообрабатывают обновления
+    """
+    dispatcher = getattr(bot, "dispatcher", None)
+    last = None
+    while True:
+        progress = (state["turns"], dispatcher.processed if dispatcher is not None else 0)
+        if state["idle"] or progress != last:
+            heartbeat.value = time.time()
+        last = progress
+        time.sleep(1)
+
+
+def _worker_main(index: int, updates, heartbeat, cache_handle):
+    # Останавливает процесс диспетчер (через None в очереди), а не сигнал группе
+    signal.signal(signal.SIGTERM, signal.SIG_IGN)
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    render_cache.attach_shared(SharedRenderCache(*cache_handle))
+    bot_main = _bot_module()
+    bot = bot_main.bot
+    if hasattr(bot, "start_workers"):
+        bot.start_workers()
+    # Метрики процесса — на своём порту: METRICS_PORT + 1 + номер процесса
+    if bot_main.METRICS_PORT:
+        metrics.start_server(bot_main.METRICS_HOST, bot_main.METRICS_PORT + 1 + index)
+
+    state = {"idle": True, "turns": 0}
+    heartbeat.value = time.time()
+    threading.Thread(target=_liveness, args=(heartbeat, state, bot), name="liveness", daemon=True).start()
+    logger.info(f"Процесс {index} (pid {os.getpid()}) запущен")
+
+    while True:
+        state["idle"] = True
+        try:
+            update = updates.get(timeout=1)
+        except queue.Empty:
+            continue
+        finally:
+            state["idle"] = False
+        if update is None:
+            break
+        try:
+            bot.process_new_updates([update])
+        except Exception as e:
+            logger.error(f"Процесс {index}: ошибка обработки: {e}")
+        state["turns"] += 1
+
+    bot_main.drain()
+
+
+class ProcessCluster:
+    def __init__(self, processes: int, queue_size: int = 1000, heartbeat_timeout: float = 30,
+                 cache_slots: int = 2048):
+        self.processes = processes
+        self.heartbeat_timeout = heartbeat_timeout
+        self._context = multiprocessing.get_context("spawn")
+        self.cache = SharedRenderCache.create(self._context, slots=cache_slots)
+        self._queues = [self._context.Queue(maxsize=queue_size) for _ in range(processes)]
+        self._heartbeats = [self._context.Value("d", 0.0) for _ in range(processes)]
+        self._workers = [None] * processes
+        self.restarts = 0
+        self._stop = threading.Event()
+        self._supervisor = threading.Thread(target=self._supervise, name="cluster-supervisor", daemon=True)
+
+    def _spawn(self, index: int):
+        self._heartbeats[index].value = time.time()
+        worker = self._context.Process(
+            target=_worker_main,
+            args=(index, self._queues[index], self._heartbeats[index], self.cache.handle()),
+            name=f"bot-process-{index}",
+            daemon=True,
+        )
+        worker.start()
+        self._workers[index] = worker
+
+    def start(self):
+        render_cache.attach_shared(self.cache)
+        for index in range(self.processes):
+            self._spawn(index)
+        self._supervisor.start()
+        return self
+
+    def submit(self, update):
+        self._queues[hash(update_chat_id(update)) % self.processes].put(update)
+
+    def depth(self) -> int:
+        return sum(q.qsize() for q in self._queues)
+
+    def health(self) -> list:
+        now = time.time()
+        return [
+            {
+                "index": index,
+                "pid": worker.pid if worker else None,
+                "alive": bool(worker and worker.is_alive()),
+                "heartbeat_age": now - heartbeat.value,
+            }
+            for index, (worker, heartbeat) in enumerate(zip(self._workers, self._heartbeats))
+        ]
+
+    def _supervise(self):
+        while not self._stop.wait(1):
+            for status in self.health():
+                if status["alive"] and status["heartbeat_age"] < self.heartbeat_timeout:
+                    continue
+                index = status["index"]
+                worker = self._workers[index]
+                if worker.is_alive():
+                    logger.error(f"Процесс {index} не отвечает {status['heartbeat_age']:.0f}с, перезапуск")
+                    worker.kill()
+                    worker.join()
+                else:
+                    logger.error(f"Процесс {index} завершился (код {worker.exitcode}), перезапуск")
+                self.restarts += 1
+                self._spawn(index)
+
+    def shutdown(self, timeout: float = 30):
+        """
+        Процессы дорабатывают свои очереди и завершаются; общая память освобождается
+        """
+        self._stop.set()
+        if self._supervisor.is_alive():
+            self._supervisor.join()
+        for q in self._queues:
+            q.put(None)
+        deadline = time.monotonic() + timeout
+        for worker in self._workers:
+            worker.join(max(deadline - time.monotonic(), 0))
+            if worker.is_alive():
+                worker.kill()
+        self.cache.close(unlink=True)
+
+
+class ClusterTeleBot(telebot.TeleBot):
+    """
+    TeleBot диспетчера: только получает обновления и отдаёт их в ProcessCluster
+    """
+
+    def __init__(self, token: str, cluster: ProcessCluster, **kwargs):
+        super().__init__(token, threaded=False, **kwargs)
+        self.cluster = cluster
+
+    def process_new_updates(self, updates):
+        for update in updates:
+            if update.update_id > self.last_update_id:
+                self.last_update_id = update.update_id
+            self.cluster.submit(update)
@@ -0,0 +1,190 @@
+"""
+Групповая совместимость по матрицам судьбы.
+
+Для группы дат все пары сравниваются сразу матричными операциями NumPy:
+сходство векторов счётчиков цифр, взаимное восполнение отсутствующих цифр,
+совпадение чисел души (second) и рода (fourth). Оценки кэшируются
+массивом на всю группу (ключ — отсортированный кортеж дат), поэтому повторный
+запрос той же группы не пересчитывается; пары дат собираются только для
+строк отчёта.
+"""
+import re
+import threading
+from collections import OrderedDict
+from datetime import datetime
+
+import numpy as np
+
+from render_cache import register
+
+DATE_RE = re.compile(r"\b\d{2}\.\d{2}\.\d{4}\b")
+
+# Вклад составляющих в итоговую оценку (сумма — 1)
+WEIGHTS = {
+    "similarity": 0.5,
+    "complement": 0.2,
+    "soul": 0.15,
+    "clan": 0.15,
+}
+
+# Для групп больше этого размера в отчёт идут только лучшие и худшие пары
+FULL_REPORT_LIMIT = 8
+TOP_PAIRS = 5
+
+
+def parse_dates(text: str) -> list:
+    """
+    Уникальные корректные даты ДД.ММ.ГГГГ из текста, в порядке появления
+    """
+    dates = []
+    for date_str in DATE_RE.findall(text):
+        try:
+            datetime.strptime(date_str, "%d.%m.%Y")
+        except ValueError:
+            continue
+        if date_str not in dates:
+            dates.append(date_str)
+    return dates
+
+
+def score_matrix(counts, second, fourth) -> np.ndarray:
+    """
+    Оценки совместимости 0–100 для всех пар: массив (n, n)
+    """
+    counts = np.asarray(counts, dtype=np.int8)
+    second = np.asarray(second)
+    fourth = np.asarray(fourth)
+
+    a, b = counts[:, None, :], counts[None, :, :]
+    # Взвешенный Жаккар: доля общих цифр с учётом количества
+    overlap = np.minimum(a, b).sum(axis=-1)
+    union = np.maximum(a, b).sum(axis=-1)
+    similarity = overlap / np.maximum(union, 1)
+    # Цифры, которых нет у одного, но есть у другого
+    complement = ((a == 0) != (b == 0)).sum(axis=-1) / 9
+
+    soul = second[:, None] == second[None, :]
+    clan = fourth[:, None] == fourth[None, :]
+
+    score = (
+        WEIGHTS["similarity"] * similarity
+        + WEIGHTS["complement"] * complement
+        + WEIGHTS["soul"] * soul
+        + WEIGHTS["clan"] * clan
+    )
+    return np.rint(score * 100).astype(np.int16)
+
+
+class GroupCache:
+    """
+    LRU массивов оценок по отсортированному кортежу дат группы, с ограничением
+    на суммарное число пар
+    """
+
+    def __init__(self, name: str, maxsize: int = 4096, max_pairs: int = 4_000_000):
+        self.name = name
+        self.maxsize = maxsize
+        self.max_pairs = max_pairs
+        self.hits = 0
+        self.misses = 0
+        self._pairs = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: tuple):
+        with self._lock:
+            scores = self._data.get(key)
+            if scores is None:
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return scores
+
+    def put(self, key: tuple, scores: np.ndarray):
+        if len(scores) > self.max_pairs:
+            return
+        # Массив общий для всех читателей — запрещаем запись
+        scores.flags.writeable = False
+        with self._lock:
+            old = self._data.pop(key, None)
+            if old is not None:
+                self._pairs -= len(old)
+            self._data[key] = scores
+            self._pairs += len(scores)
+            while len(self._data) > self.maxsize or self._pairs > self.max_pairs:
+                _, evicted = self._data.popitem(last=False)
+                self._pairs -= len(evicted)
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "name": self.name,
+                "entries": len(self._data),
+                "pairs": self._pairs,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+            }
+
+
+# Регистрируется вместе с RenderCache — попадает в cache_stats и метрики
+group_cache = register(GroupCache("compatibility.groups"))
+
+
+def group_scores(dates: list, matrix_data) -> tuple:
+    """
+    Оценки всех пар группы: (отсортированные даты, массив оценок в порядке
+    np.triu_indices); matrix_data(date_str) → данные матрицы
+    """
+    dates = tuple(sorted(dates))
+    scores = group_cache.get(dates)
+    if scores is not None:
+        return dates, scores
+
+    data = [matrix_data(date_str) for date_str in dates]
+    matrix = score_matrix(
+        [d["counts"] for d in data],
+        [d["second"] for d in data],
+        [d["fourth"] for d in data],
+    )
+    scores = matrix[np.triu_indices(len(dates), k=1)]
+    group_cache.put(dates, scores)
+    return dates, scores
+
+
+def _level(score: int) -> str:
+    if score >= 75:
+        return "💞"
+    if score >= 55:
+        return "🤝"
+    if score >= 40:
+        return "⚖️"
+    return "⚡"
+
+
+def build_compatibility_text(dates: list, matrix_data) -> str:
+    dates, scores = group_scores(dates, matrix_data)
+    order = np.argsort(-scores, kind="stable")
+    if len(dates) > FULL_REPORT_LIMIT:
+        order = np.concatenate([order[:TOP_PAIRS], order[-TOP_PAIRS:]])
+    # Даты собираем только для пар, попавших в отчёт
+    rows, cols = np.triu_indices(len(dates), k=1)
+    ranked = [((dates[i], dates[j]), int(score))
+              for i, j, score in zip(rows[order].tolist(), cols[order].tolist(), scores[order].tolist())]
+    average = scores.mean()
+
+    parts = [f"💫 *СОВМЕСТИМОСТЬ ГРУППЫ* ({len(dates)} чел.)\n\n"]
+    parts.append(f"*Средняя совместимость:* {average:.0f}%\n\n")
+
+    if len(dates) <= FULL_REPORT_LIMIT:
+        parts.append("*Все пары:*\n")
+        parts.extend(f"{_level(score)} {a} × {b}: {score}%\n" for (a, b), score in ranked)
+    else:
+        parts.append("*Самые гармоничные пары:*\n")
+        parts.extend(f"{_level(score)} {a} × {b}: {score}%\n" for (a, b), score in ranked[:TOP_PAIRS])
+        parts.append("\n*Пары с напряжением:*\n")
+        parts.extend(f"{_level(score)} {a} × {b}: {score}%\n" for (a, b), score in ranked[TOP_PAIRS:])
+
+    return "".join(parts)
@@ -0,0 +1,119 @@
+"""
+Кэш ежедневного гороскопа.
+
+Текст daily_horoscope зависит только от даты и чисел second / fourth (1–9),
+поэтому все 81 вариант рендерятся один раз в день. Таблица дня хранится
+кортежем (дата, тексты) и заменяется целиком одним присваиванием — запрос
+около полуночи видит либо старую, либо новую таблицу, но не их смесь.
+"""
+import logging
+import os
+import threading
+from datetime import date, datetime, timedelta
+
+import pytz
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TIMEZONE = os.getenv("BOT_TIMEZONE", "Europe/Moscow")
+
+NUMBERS = range(1, 10)
+
+
+class DailyHoroscopeCache:
+    """
+    Предрасчитанные варианты daily_horoscope(matrix_data, day) на текущий день
+    """
+
+    def __init__(self, build, timezone: str = None, prewarm_seconds: int = 300):
+        self._build = build
+        self.timezone = pytz.timezone(timezone or DEFAULT_TIMEZONE)
+        self.prewarm_seconds = prewarm_seconds
+        self._table = (None, {})
+        self._next = (None, {})
+        self._lock = threading.Lock()
+        self._thread = None
+        self._stop = threading.Event()
+
+    def now(self) -> datetime:
+        return datetime.now(self.timezone)
+
+    def _render_table(self, day: datetime) -> tuple:
+        texts = {
+            (second, fourth): self._build({"second": second, "fourth": fourth}, day)
+            for second in NUMBERS
+            for fourth in NUMBERS
+        }
+        return day.date(), texts
+
+    def _rollover(self, now: datetime) -> tuple:
+        with self._lock:
+            if self._table[0] != now.date():
+                next_table = self._next
+                self._table = next_table if next_table[0] == now.date() else self._render_table(now)
+            return self._table
+
+    def table(self, now: datetime = None) -> tuple:
+        now = now or self.now()
+        table = self._table
+        if table[0] != now.date():
+            table = self._rollover(now)
+        return table
+
+    def table_for(self, day: date) -> dict:
+        """
+        Тексты на произвольную дату (для рассылки по часовым поясам подписчиков)
+        """
+        for table in (self._table, self._next):
+            if table[0] == day:
+                return table[1]
+        return self._render_table(datetime(day.year, day.month, day.day))[1]
+
+    def get(self, matrix_data) -> str:
+        now = self.now()
+        day, texts = self.table(now)
+        text = texts.get((matrix_data["second"], matrix_data["fourth"]))
+        if text is None:
+            # Нестандартные числа — рендерим напрямую
+            text = self._build(matrix_data, now)
+        return text
+
+    def _next_midnight(self, now: datetime) -> datetime:
+        # Через localize, а не now + 1 день: в дни перехода на летнее время
+        # в сутках 23 или 25 часов
+        tomorrow = now.date() + timedelta(days=1)
+        return self.timezone.localize(datetime(tomorrow.year, tomorrow.month, tomorrow.day))
+
+    def seconds_until_midnight(self, now: datetime = None) -> float:
+        now = now or self.now()
+        return (self._next_midnight(now) - now).total_seconds()
+
+    def prewarm_next(self, now: datetime = None):
+        """
+        Готовит таблицу следующего дня; table() подхватит её после полуночи
+        """
+        self._next = self._render_table(self._next_midnight(now or self.now()))
+        logger.info(f"Гороскопы на {self._next[0]} подготовлены заранее")
+
+    def _prewarm_loop(self):
+        while not self._stop.is_set():
+            if self._stop.wait(max(self.seconds_until_midnight() - self.prewarm_seconds, 0)):
+                return
+
+            self.prewarm_next()
+
+            if self._stop.wait(self.seconds_until_midnight() + 0.01):
+                return
+            self.table()
+
+    def start_prewarm(self):
+        """
+        Фоновый поток готовит таблицу следующего дня за prewarm_seconds до полуночи
+        """
+        if self._thread is None:
+            self.table()
+            self._thread = threading.Thread(target=self._prewarm_loop, name="daily-prewarm", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
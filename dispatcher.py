@@ -0,0 +1,130 @@
+"""
+Пул обработчиков обновлений с ограниченной очередью.
+
+Каждый чат закреплён за одним рабочим потоком (chat_id % workers), поэтому
+сообщения одного пользователя обрабатываются строго по порядку, а медленный
+ответ одному чату не задерживает остальные. Очереди ограничены: когда они
+заполнены, submit блокируется и опрос Telegram притормаживает (backpressure).
+"""
+import logging
+import queue
+import threading
+
+import telebot
+
+logger = logging.getLogger(__name__)
+
+_STOP = object()
+
+
+def update_chat_id(update) -> int:
+    """
+    Ключ упорядочивания: чат сообщения, иначе пользователь, иначе само обновление
+    """
+    for message in (update.message, update.edited_message, update.channel_post):
+        if message is not None:
+            return message.chat.id
+    if update.callback_query is not None:
+        return update.callback_query.from_user.id
+    if update.inline_query is not None:
+        return update.inline_query.from_user.id
+    return update.update_id
+
+
+class ChatDispatcher:
+    """
+    Рабочие потоки с отдельной ограниченной очередью на каждый
+    """
+
+    def __init__(self, handle, workers: int = 4, queue_size: int = 1000, name: str = "dispatcher"):
+        self._handle = handle
+        self._queues = [queue.Queue(maxsize=max(1, queue_size // workers)) for _ in range(workers)]
+        self._threads = [
+            threading.Thread(target=self._worker, args=(q,), name=f"{name}-{i}", daemon=True)
+            for i, q in enumerate(self._queues)
+        ]
+        self._closed = False
+        self._started = False
+        self._inflight = 0
+        self.processed = 0
+        self._lock = threading.Lock()
+
+    def start(self):
+        for thread in self._threads:
+            thread.start()
+        self._started = True
+        return self
+
+    def submit(self, key: int, item, timeout: float = None):
+        """
+        Ставит item в очередь потока, отвечающего за key.
+        Блокируется, пока в очереди нет места (queue.Full по истечении timeout)
+        """
+        if self._closed:
+            raise RuntimeError("Диспетчер остановлен")
+        self._queues[hash(key) % len(self._queues)].put(item, timeout=timeout)
+
+    def depth(self) -> int:
+        return sum(q.qsize() for q in self._queues)
+
+    def inflight(self) -> int:
+        return self._inflight
+
+    def _worker(self, q: queue.Queue):
+        while True:
+            item = q.get()
+            if item is _STOP:
+                return
+            with self._lock:
+                self._inflight += 1
+            try:
+                self._handle(item)
+            except Exception as e:
+                logger.error(f"Ошибка обработки обновления: {e}")
+            finally:
+                with self._lock:
+                    self._inflight -= 1
+                    self.processed += 1
+
+    def shutdown(self, timeout: float = 30):
+        """
+        Перестаёт принимать обновления и дожидается обработки уже принятых
+        """
+        self._closed = True
+        if not self._started:
+            return
+        for q in self._queues:
+            q.put(_STOP)
+        for thread in self._threads:
+            thread.join(timeout)
+        pending = self.depth()
+        if pending:
+            logger.warning(f"Не обработано обновлений при остановке: {pending}")
+
+
+class DispatchingTeleBot(telebot.TeleBot):
+    """
+    TeleBot, раздающий обновления в ChatDispatcher вместо обработки в потоке опроса
+    """
+
+    def __init__(self, token: str, workers: int = 4, queue_size: int = 1000, **kwargs):
+        # Обработчики выполняются в потоках диспетчера, свой пул telebot не нужен
+        super().__init__(token, threaded=False, **kwargs)
+        self.dispatcher = ChatDispatcher(self._process_one, workers, queue_size, name="bot-worker")
+
+    def _process_one(self, update):
+        super().process_new_updates([update])
+
+    def process_new_updates(self, updates):
+        for update in updates:
+            # Смещение getUpdates сдвигаем сразу, иначе опрос вернёт их повторно
+            if update.update_id > self.last_update_id:
+                self.last_update_id = update.update_id
+            self.dispatcher.submit(update_chat_id(update), update)
+
+    def start_workers(self):
+        self.dispatcher.start()
+
+    def shutdown(self, timeout: float = 30):
+        self.stop_polling()
+        self.dispatcher.shutdown(timeout)
@@ -0,0 +1,274 @@
+"""
+Локальная заглушка Telegram Bot API для нагрузочных прогонов.
+
+Понимает getUpdates (long polling), sendMessage, sendPhoto,
+answerInlineQuery и setWebhook; остальные методы отвечают true. Задержка
+ответа и 429 Too Many Requests настраиваются: 429 выпадает с вероятностью
+error_rate либо при превышении global_rate отправок в секунду, как у
+настоящего Telegram. Картинку для бота заглушка отдаёт сама по /image.png.
+
+    python fake_api.py --port 8081 --latency 0.05 --error-rate 0.01
+    TELEGRAM_API_URL=http://127.0.0.1:8081/bot{0}/{1} \\
+        IMAGE_URL=http://127.0.0.1:8081/image.png python main.py
+
+Обновления добавляются через push_update (см. loadgen.py).
+"""
+import argparse
+import email.parser
+import email.policy
+import itertools
+import json
+import logging
+import random
+import struct
+import threading
+import time
+import zlib
+from collections import Counter, deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlsplit
+
+logger = logging.getLogger(__name__)
+
+SEND_METHODS = {"sendMessage", "sendPhoto", "answerInlineQuery"}
+
+
+def _png() -> bytes:
+    # PNG 1×1, чтобы бот мог «скачать» картинку без внешней сети
+    def chunk(kind: bytes, data: bytes) -> bytes:
+        return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data))
+
+    header = struct.pack(">IIBBBBB", 1, 1, 8, 2, 0, 0, 0)
+    return b"\x89PNG\r\n\x1a\n" + chunk(b"IHDR", header) + chunk(b"IDAT", zlib.compress(b"\x00\xd4\xaf\x37")) + chunk(b"IEND", b"")
+
+
+IMAGE = _png()
+
+
+class _Handler(BaseHTTPRequestHandler):
+    server_version = "FakeBotAPI"
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        if urlsplit(self.path).path == "/image.png":
+            self._send(200, IMAGE, "image/png")
+        else:
+            self._dispatch()
+
+    def do_POST(self):
+        self._dispatch()
+
+    def _params(self) -> dict:
+        url = urlsplit(self.path)
+        params = dict(parse_qsl(url.query))
+        length = int(self.headers.get("Content-Length", 0))
+        body = self.rfile.read(length) if length else b""
+        content_type = self.headers.get("Content-Type", "")
+        if content_type.startswith("application/json") and body:
+            params.update(json.loads(body))
+        elif content_type.startswith("application/x-www-form-urlencoded"):
+            params.update(parse_qsl(body.decode("utf-8")))
+        elif content_type.startswith("multipart/form-data"):
+            # Нужны только текстовые поля; файлы не разбираем
+            message = email.parser.BytesParser(policy=email.policy.HTTP).parsebytes(
+                f"Content-Type: {content_type}\r\n\r\n".encode("latin-1") + body)
+            for part in message.iter_parts():
+                if part.get_filename() is None:
+                    params[part.get_param("name", header="content-disposition")] = part.get_content()
+        return params
+
+    def _dispatch(self):
+        parts = urlsplit(self.path).path.strip("/").split("/")
+        if len(parts) != 2 or not parts[0].startswith("bot"):
+            self._send(404, b"", "text/plain")
+            return
+        try:
+            params = self._params()
+        except (ValueError, json.JSONDecodeError):
+            self._json(400, {"ok": False, "error_code": 400, "description": "Bad Request: invalid body"})
+            return
+        status, payload = self.server.api.call(parts[1], params)
+        self._json(status, payload)
+
+    def _json(self, status: int, payload: dict):
+        self._send(status, json.dumps(payload).encode("utf-8"), "application/json")
+
+    def _send(self, status: int, body: bytes, content_type: str):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        logger.debug("%s - %s", self.address_string(), format % args)
+
+
+class FakeBotAPI:
+    def __init__(self, host: str = "127.0.0.1", port: int = 8081, latency: float = 0.0, jitter: float = 0.0,
+                 error_rate: float = 0.0, global_rate: float = None, retry_after: int = 1, on_send=None):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.global_rate = global_rate
+        self.retry_after = retry_after
+        # on_send(method, params, время perf_counter) — для замера задержки ответа
+        self.on_send = on_send
+        self.calls = Counter()
+        self.throttled = 0
+        self.ready = threading.Event()
+        self._updates = deque()
+        self._update_ids = itertools.count(1)
+        self._message_ids = itertools.count(1)
+        self._cond = threading.Condition()
+        self._released = False
+        self._window = deque()
+        self._window_lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), _Handler)
+        self._server.daemon_threads = True
+        self._server.api = self
+        self._thread = None
+
+    @property
+    def address(self) -> tuple:
+        return self._server.server_address
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.address
+        return f"http://{host}:{port}"
+
+    @property
+    def api_url(self) -> str:
+        # Формат telebot.apihelper.API_URL
+        return self.base_url + "/bot{0}/{1}"
+
+    def push_update(self, update: dict) -> int:
+        """
+        Ставит обновление в очередь getUpdates; update_id назначается здесь
+        """
+        with self._cond:
+            update["update_id"] = update_id = next(self._update_ids)
+            self._updates.append(update)
+            self._cond.notify_all()
+        return update_id
+
+    def pending(self) -> int:
+        return len(self._updates)
+
+    def release_pollers(self):
+        """
+        Висящие и последующие getUpdates отвечают сразу — бот быстрее останавливается
+        """
+        with self._cond:
+            self._released = True
+            self._cond.notify_all()
+
+    def _get_updates(self, params: dict) -> list:
+        offset = int(params.get("offset", 0))
+        limit = min(int(params.get("limit", 100)), 100)
+        deadline = time.monotonic() + float(params.get("timeout", 0))
+        self.ready.set()
+        with self._cond:
+            # Как в Telegram: offset подтверждает все обновления до него
+            while self._updates and self._updates[0]["update_id"] < offset:
+                self._updates.popleft()
+            while not self._updates:
+                if self._released:
+                    return []
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or not self._cond.wait(remaining):
+                    return []
+            return list(itertools.islice(self._updates, limit))
+
+    def _throttle(self) -> bool:
+        if self.error_rate and random.random() < self.error_rate:
+            return True
+        if self.global_rate:
+            now = time.monotonic()
+            with self._window_lock:
+                while self._window and self._window[0] <= now - 1:
+                    self._window.popleft()
+                if len(self._window) >= self.global_rate:
+                    return True
+                self._window.append(now)
+        return False
+
+    def _message(self, params: dict, **fields) -> dict:
+        chat_id = int(params["chat_id"])
+        return {
+            "message_id": next(self._message_ids),
+            "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "private"},
+            **fields,
+        }
+
+    def call(self, method: str, params: dict) -> tuple:
+        self.calls[method] += 1
+        if method == "getUpdates":
+            return 200, {"ok": True, "result": self._get_updates(params)}
+
+        if self.latency or self.jitter:
+            time.sleep(self.latency + random.uniform(0, self.jitter))
+
+        if method in SEND_METHODS and self._throttle():
+            self.throttled += 1
+            return 429, {
+                "ok": False,
+                "error_code": 429,
+                "description": f"Too Many Requests: retry after {self.retry_after}",
+                "parameters": {"retry_after": self.retry_after},
+            }
+
+        if method == "sendMessage":
+            result = self._message(params, text=params.get("text", ""))
+        elif method == "sendPhoto":
+            result = self._message(params, photo=[
+                {"file_id": "fake-photo", "file_unique_id": "fake-photo", "width": 1, "height": 1}
+            ], caption=params.get("caption"))
+        elif method == "getMe":
+            result = {"id": 1, "is_bot": True, "first_name": "FakeBot", "username": "fake_bot"}
+        else:
+            if method == "setWebhook":
+                self.ready.set()
+            result = True
+
+        if method in SEND_METHODS and self.on_send is not None:
+            self.on_send(method, params, time.perf_counter())
+        return 200, {"ok": True, "result": result}
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, name="fake-api", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Локальная заглушка Telegram Bot API")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--latency", type=float, default=0.0, help="задержка ответа, с")
+    parser.add_argument("--jitter", type=float, default=0.0, help="случайная добавка к задержке, с")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="доля отправок с ответом 429")
+    parser.add_argument("--global-rate", type=float, default=None, help="лимит отправок в секунду")
+    parser.add_argument("--retry-after", type=int, default=1)
+    args = parser.parse_args()
+
+    logging.basicConfig(format='%(asctime)s - %(name)s - %(levelname)s - %(message)s', level=logging.INFO)
+    api = FakeBotAPI(args.host, args.port, args.latency, args.jitter, args.error_rate,
+                     args.global_rate, args.retry_after).start()
+    logger.info(f"Bot API: {api.api_url}, картинка: {api.base_url}/image.png")
+    try:
+        while True:
+            time.sleep(10)
+            logger.info(f"Вызовы: {dict(api.calls)}, 429: {api.throttled}")
+    except KeyboardInterrupt:
+        api.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,48 +1,61 @@
 from datetime import datetime
-from values import matrix, tasks
+from catalog import matrix, tasks
+from matrix import count_digits, matrix_key
+from render_cache import RenderCache, register
+
+_matrix_cache = register(RenderCache("horoscope.matrix"))
+_tasks_cache = register(RenderCache("horoscope.tasks"))
+
+
+def _matrix_value(number: int, count: int) -> str:
+    return matrix.get(matrix_key(number, count), "—")
 
 
 def get_matrix_value(full_array, number: int) -> str:
     """
     Абсолютно идентично getMatrixValue из App.tsx
     """
-    count = full_array.count(number)
+    return _matrix_value(number, full_array.count(number))
 
-    if count == 0:
-        key = f"{number}0"
-    elif count > 5:
-        key = str(number) * (count - 5)
-    else:
-        key = str(number) * count
 
-    return matrix.get(key, "—")
+def _counts(matrix_data) -> tuple:
+    counts = matrix_data.get("counts")
+    return counts if counts is not None else count_digits(matrix_data["full"])
 
 
-def build_matrix_text(matrix_data):
-    full = matrix_data["full"]
+def _render_matrix_text(counts) -> str:
+    parts = ["🔢 *Матрица судьбы*\n\n"]
+    for n, count in enumerate(counts, 1):
+        parts.append(f"*{n}:*\n{_matrix_value(n, count)}\n\n")
+
+    return "".join(parts)
 
-    text = "🔢 *Матрица судьбы*\n\n"
-    for n in range(1, 10):
-        text += f"*{n}:*\n{get_matrix_value(full, n)}\n\n"
 
-    return text
+def build_matrix_text(matrix_data):
+    counts = _counts(matrix_data)
+    return _matrix_cache.get_or_render(counts, _render_matrix_text, counts)
 
 
-def build_tasks_text(matrix_data):
-    soul_task = tasks.get(str(matrix_data["second"]), "")
-    clan_task = tasks.get(str(matrix_data["fourth"]), "")
+def _render_tasks_text(second, fourth) -> str:
+    soul_task = tasks.get(str(second), "")
+    clan_task = tasks.get(str(fourth), "")
 
-    text = "🧬 *Кармические задачи*\n\n"
+    parts = ["🧬 *Кармические задачи*\n\n"]
     if soul_task:
-        text += f"*Личная задача Души:*\n{soul_task}\n\n"
+        parts.append(f"*Личная задача Души:*\n{soul_task}\n\n")
     if clan_task:
-        text += f"*Родовая задача (ЧРП):*\n{clan_task}\n\n"
+        parts.append(f"*Родовая задача (ЧРП):*\n{clan_task}\n\n")
+
+    return "".join(parts)
 
-    return text
+
+def build_tasks_text(matrix_data):
+    key = (matrix_data["second"], matrix_data["fourth"])
+    return _tasks_cache.get_or_render(key, _render_tasks_text, *key)
 
 
-def daily_horoscope(matrix_data):
-    today = datetime.now().strftime("%d.%m.%Y")
+def daily_horoscope(matrix_data, day=None):
+    today = (day or datetime.now()).strftime("%d.%m.%Y")
 
     return f"""
 ✨ *Гороскоп на {today}*
@@ -0,0 +1,238 @@
+"""
+Доставка картинки к ответу.
+
+Картинка одна и та же для всех, поэтому она скачивается один раз в локальный
+кэш, а после первой загрузки в Telegram отправляется по file_id. Запросы к
+внешнему сервису идут через автомат (circuit breaker): после серии ошибок
+они на время прекращаются. Отправка по file_id только ставится в очередь
+SendScheduler и не занимает поток; в фоновом потоке (с ограниченной очередью)
+идёт лишь загрузка, пока file_id ещё не известен.
+"""
+import io
+import logging
+import os
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+
+import requests
+from telebot.apihelper import ApiTelegramException
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+IMAGE_URL = os.getenv(
+    "IMAGE_URL",
+    "https://image.pollinations.ai/prompt/mystical%20tarot%20card%20esoteric%20symbols%20golden%20light.png",
+)
+IMAGE_CAPTION = "🎴 *Ваша персональная энергетическая карта*"
+
+
+def _stale_file_id(error) -> bool:
+    """
+    Telegram не принял сам file_id (например, сменился токен). Прочие 400
+    («chat not found» и т. п.) относятся к одному чату, file_id не трогаем
+    """
+    if not isinstance(error, ApiTelegramException) or error.error_code != 400:
+        return False
+    description = (error.description or "").lower()
+    return "file identifier" in description or "file_id" in description
+
+
+class CircuitBreaker:
+    """
+    После failure_threshold ошибок подряд размыкается на reset_timeout секунд,
+    затем пропускает одну пробную попытку
+    """
+
+    def __init__(self, failure_threshold: int = 3, reset_timeout: float = 300):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return "half-open"
+        return "open"
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.state != "half-open":
+                return self.state == "closed"
+            # Одна пробная попытка, остальные ждут следующего окна
+            self.opened_at = time.monotonic()
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+
+
+class ImageDelivery:
+    def __init__(self, url: str = IMAGE_URL, cache_dir: str = None, timeout: float = 10, workers: int = 2,
+                 max_pending: int = 100):
+        self.url = url
+        self.timeout = timeout
+        self.cache_dir = cache_dir or os.getenv("IMAGE_CACHE_DIR", ".cache")
+        self.breaker = CircuitBreaker()
+        self._session = requests.Session()
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="image")
+        # Загрузки сверх max_pending отбрасываются, а не копятся в очереди пула
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._image = None
+        self._file_id = None
+        self._lock = threading.Lock()
+        self._load_cached()
+
+    @property
+    def _image_path(self) -> str:
+        return os.path.join(self.cache_dir, "image.png")
+
+    @property
+    def _file_id_path(self) -> str:
+        return os.path.join(self.cache_dir, "image_file_id.txt")
+
+    def _load_cached(self):
+        try:
+            with open(self._image_path, "rb") as f:
+                self._image = f.read()
+        except OSError:
+            pass
+        try:
+            with open(self._file_id_path) as f:
+                self._file_id = f.read().strip() or None
+        except OSError:
+            pass
+
+    def _write_cache(self, path: str, data):
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            mode = "wb" if isinstance(data, bytes) else "w"
+            with open(path, mode) as f:
+                f.write(data)
+        except OSError as e:
+            logger.warning(f"Не удалось сохранить кэш картинки: {e}")
+
+    def fetch(self):
+        """
+        Картинка из кэша либо один запрос к внешнему сервису; None, если недоступна
+        """
+        if self._image is not None:
+            return self._image
+
+        with self._lock:
+            if self._image is not None:
+                return self._image
+            if not self.breaker.allow():
+                return None
+            try:
+                response = self._session.get(self.url, timeout=self.timeout)
+                response.raise_for_status()
+                if not response.headers.get('content-type', '').startswith('image/'):
+                    raise ValueError(f"Неожиданный тип: {response.headers.get('content-type')}")
+            except Exception as e:
+                self.breaker.record_failure()
+                logger.debug(f"Изображение не загрузилось: {e}")
+                return None
+
+            self.breaker.record_success()
+            self._image = response.content
+            self._write_cache(self._image_path, self._image)
+            return self._image
+
+    @staticmethod
+    def _send_photo(bot, chat_id: int, photo, caption: str):
+        message = bot.send_photo(chat_id, photo=photo, caption=caption)
+        # SendScheduler возвращает Future — file_id нужен из ответа
+        return message.result() if isinstance(message, Future) else message
+
+    def send(self, bot, chat_id: int, caption: str = IMAGE_CAPTION):
+        file_id = self._file_id
+        if file_id:
+            try:
+                return self._send_photo(bot, chat_id, file_id, caption)
+            except ApiTelegramException as e:
+                if not _stale_file_id(e):
+                    raise
+                # file_id устарел — загружаем заново
+                if self._file_id == file_id:
+                    self._file_id = None
+
+        image = self.fetch()
+        if image is None:
+            return None
+
+        message = self._send_photo(bot, chat_id, io.BytesIO(image), caption)
+        if message is not None and message.photo:
+            self._file_id = message.photo[-1].file_id
+            self._write_cache(self._file_id_path, self._file_id)
+        return message
+
+    def _send_logged(self, bot, chat_id: int, caption: str):
+        start = time.perf_counter()
+        try:
+            self.send(bot, chat_id, caption)
+        except Exception as e:
+            metrics.ERRORS.inc(type(e).__name__)
+            logger.debug(f"Изображение не отправлено: {e}")
+        finally:
+            metrics.STAGE_SECONDS.observe(time.perf_counter() - start, "image")
+
+    def _on_sent(self, future: Future, bot, chat_id: int, caption: str, file_id: str, start: float):
+        error = future.exception()
+        if _stale_file_id(error):
+            # file_id устарел — загружаем заново
+            if self._file_id == file_id:
+                self._file_id = None
+            self._upload_async(bot, chat_id, caption)
+        elif error is not None:
+            metrics.ERRORS.inc(type(error).__name__)
+            logger.debug(f"Изображение не отправлено: {error}")
+        metrics.STAGE_SECONDS.observe(time.perf_counter() - start, "image")
+
+    def _upload_async(self, bot, chat_id: int, caption: str):
+        if not self._slots.acquire(blocking=False):
+            metrics.ERRORS.inc("ImageQueueFull")
+            logger.debug("Очередь загрузки картинки переполнена, отправка пропущена")
+            return None
+        future = self._executor.submit(self._send_logged, bot, chat_id, caption)
+        future.add_done_callback(lambda _: self._slots.release())
+        return future
+
+    def send_async(self, bot, chat_id: int, caption: str = IMAGE_CAPTION) -> Future:
+        file_id = self._file_id
+        if not file_id:
+            return self._upload_async(bot, chat_id, caption)
+
+        start = time.perf_counter()
+        try:
+            future = bot.send_photo(chat_id, photo=file_id, caption=caption)
+        except Exception as e:
+            future = Future()
+            future.set_exception(e)
+        if not isinstance(future, Future):
+            # Обычный TeleBot отправляет сразу и возвращает сообщение
+            message, future = future, Future()
+            future.set_result(message)
+        future.add_done_callback(lambda f: self._on_sent(f, bot, chat_id, caption, file_id, start))
+        return future
+
+    def prefetch(self):
+        if self._image is None and self._file_id is None:
+            self._executor.submit(self.fetch)
+
+    def shutdown(self):
+        self._executor.shutdown(wait=True)
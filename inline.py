@@ -0,0 +1,138 @@
+"""
+Inline-режим: ответы на «@bot 15.05.1990».
+
+Inline-запрос приходит на каждое нажатие клавиши, а ответить на него нужно
+за считанные секунды. Неполный ввод отсекается регулярным выражением без
+разбора даты. Готовые наборы результатов для полной даты хранятся в LRU по
+(день, дата), а тексты для них берутся из кэшей build_*_text и из таблицы
+дня DailyHoroscopeCache. Ответ не зависит от пользователя (is_personal=False),
+поэтому Telegram сам кэширует его по тексту запроса — для полной даты до
+полуночи, когда меняется гороскоп.
+"""
+import re
+import threading
+from collections import OrderedDict
+from datetime import datetime
+
+from telebot import types
+
+from horoscope import build_matrix_text, build_tasks_text
+from sender import MAX_MESSAGE_LENGTH, utf16_length
+
+DATE_RE = re.compile(r"\d\d\.\d\d\.\d{4}")
+# Ввод, который ещё может дописаться до ДД.ММ.ГГГГ
+PARTIAL_RE = re.compile(r"\d?|\d\d(\.(\d?|\d\d(\.\d{0,3})?))?")
+
+# Подсказки не меняются — Telegram может держать их сутки
+HINT_CACHE_TIME = 24 * 60 * 60
+
+HINT_TEXT = "Введите дату рождения: ДД.ММ.ГГГГ"
+FORMAT_ERROR_TEXT = "Формат: ДД.ММ.ГГГГ, например 15.05.1990"
+NO_SUCH_DATE_TEXT = "Такой даты нет — проверьте день и месяц"
+
+TRUNCATED_TEXT = "…\n\nПолный разбор — в личных сообщениях с ботом"
+
+
+def _fit(text: str) -> str:
+    """
+    Текст, укороченный по границе абзаца до лимита сообщения
+    """
+    if utf16_length(text) <= MAX_MESSAGE_LENGTH:
+        return text
+    limit = MAX_MESSAGE_LENGTH - utf16_length(TRUNCATED_TEXT)
+    end = text.rfind("\n\n", 0, limit)
+    while utf16_length(text[:end]) > limit:
+        end = text.rfind("\n\n", 0, end)
+    return text[:end] + TRUNCATED_TEXT
+
+
+def _hint(text: str) -> dict:
+    return {
+        "results": [],
+        "cache_time": HINT_CACHE_TIME,
+        "is_personal": False,
+        "button": types.InlineQueryResultsButton(text=text, start_parameter="inline"),
+    }
+
+
+# Ответы-подсказки готовы заранее: неполный ввод — самый частый запрос
+HINTS = {text: _hint(text) for text in (HINT_TEXT, FORMAT_ERROR_TEXT, NO_SUCH_DATE_TEXT)}
+
+
+def _article(result_id: str, title: str, description: str, text: str):
+    return types.InlineQueryResultArticle(
+        id=result_id,
+        title=title,
+        description=description,
+        input_message_content=types.InputTextMessageContent(_fit(text), parse_mode="Markdown"),
+    )
+
+
+class InlineAnswers:
+    """
+    Аргументы answer_inline_query для текста запроса
+    """
+
+    def __init__(self, matrix_data, daily_cache, maxsize: int = 4096, name: str = "inline.answers"):
+        self.name = name
+        self._matrix_data = matrix_data
+        self._daily_cache = daily_cache
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _render(self, date_str: str, now: datetime) -> list:
+        matrix_data = self._matrix_data(date_str)
+        return [
+            _article("horoscope", "🔮 Прогноз на сегодня", f"{date_str} · {now:%d.%m.%Y}",
+                     self._daily_cache.get(matrix_data)),
+            _article("tasks", "🧬 Кармические задачи", f"Душа {matrix_data['second']} · Род {matrix_data['fourth']}",
+                     build_tasks_text(matrix_data)),
+            _article("matrix", "🔢 Матрица судьбы", date_str, build_matrix_text(matrix_data)),
+        ]
+
+    def answer(self, query: str) -> dict:
+        query = query.strip()
+        if not DATE_RE.fullmatch(query):
+            return HINTS[HINT_TEXT if PARTIAL_RE.fullmatch(query) else FORMAT_ERROR_TEXT]
+
+        now = self._daily_cache.now()
+        key = (now.date(), query)
+        with self._lock:
+            results = self._data.get(key)
+            if results is not None:
+                self._data.move_to_end(key)
+                self.hits += 1
+            else:
+                self.misses += 1
+
+        if results is None:
+            try:
+                datetime.strptime(query, "%d.%m.%Y")
+            except ValueError:
+                return HINTS[NO_SUCH_DATE_TEXT]
+            results = self._render(query, now)
+            with self._lock:
+                self._data[key] = results
+                while len(self._data) > self.maxsize:
+                    self._data.popitem(last=False)
+
+        return {
+            "results": results,
+            # Гороскоп в ответе действителен до полуночи по BOT_TIMEZONE
+            "cache_time": int(self._daily_cache.seconds_until_midnight()) + 1,
+            "is_personal": False,
+        }
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "name": self.name,
+                "entries": len(self._data),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+            }
@@ -0,0 +1,415 @@
+"""
+Нагрузочный прогон: настоящий main.py против локальной заглушки Bot API.
+
+Генератор поднимает FakeBotAPI, запускает бота отдельным процессом в нужном
+режиме и подаёт обновления ступенями частоты. Обновления бывают
+синтетическими (даты, inline-запросы, /compat, ошибки ввода) или
+записанными: JSONL-файл, по объекту Update на строку. Для каждой ступени
+выводятся устойчивая пропускная способность, перцентили задержки от подачи
+обновления до ответа бота и доля ошибок. Первая ступень, где бот перестаёт
+успевать, отмечается как насыщение.
+
+    python loadgen.py --rates 10,20,40 --duration 20
+    python loadgen.py --mode webhook --replay updates.jsonl --rates 100
+    python loadgen.py --processes 4 --env SEND_GLOBAL_RATE=1000 --rates 200,400,800
+
+Исходящие сообщения бот ограничивает SEND_GLOBAL_RATE (по умолчанию 30/с,
+как лимит Telegram). Чтобы найти предел самого бота, поднимите лимит через --env.
+"""
+import argparse
+import copy
+import json
+import os
+import random
+import secrets
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+
+import requests
+
+from fake_api import FakeBotAPI
+from webhook import SECRET_HEADER
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+TOKEN = "123456:LOADTEST"
+
+# Доли типов синтетических обновлений
+MIX = {
+    "date": 0.75,
+    "inline": 0.15,
+    "invalid": 0.05,
+    "compat": 0.03,
+    "start": 0.02,
+}
+
+ERROR_REPLY = "Произошла ошибка"
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _percentile(values: list, q: float) -> float:
+    if not values:
+        return float("nan")
+    return values[min(int(q * len(values)), len(values) - 1)]
+
+
+class Synthetic:
+    """
+    Поток обновлений от users пользователей по долям MIX
+    """
+
+    def __init__(self, users: int = 10000, seed: int = 1, mix: dict = None):
+        self.users = users
+        self.rng = random.Random(seed)
+        mix = mix or MIX
+        self.kinds = list(mix)
+        self.weights = list(mix.values())
+
+    def _date(self) -> str:
+        day = date(1940, 1, 1) + timedelta(days=self.rng.randrange(70 * 365))
+        return day.strftime("%d.%m.%Y")
+
+    def _text(self, kind: str) -> str:
+        if kind == "date":
+            return self._date()
+        if kind == "invalid":
+            return self.rng.choice(["31.02.1990", "15/05/1990", "привет", "1990"])
+        if kind == "compat":
+            return "/compat " + " ".join(self._date() for _ in range(self.rng.randint(2, 6)))
+        return "/start"
+
+    def update(self, seq: int) -> dict:
+        user = {"id": 10_000_000 + seq % self.users, "is_bot": False, "first_name": "Load"}
+        kind = self.rng.choices(self.kinds, self.weights)[0]
+        if kind == "inline":
+            return {"inline_query": {"id": str(seq), "from": user, "query": self._date(), "offset": ""}}
+        return {"message": {
+            "message_id": seq,
+            "date": int(time.time()),
+            "chat": {"id": user["id"], "type": "private"},
+            "from": user,
+            "text": self._text(kind),
+        }}
+
+
+class Replay:
+    """
+    Записанный поток (JSONL с Update) по кругу; id сообщений и запросов
+    переназначаются, чтобы ответы можно было сопоставить с обновлениями
+    """
+
+    def __init__(self, path: str):
+        with open(path, encoding="utf-8") as f:
+            self.updates = [json.loads(line) for line in f if line.strip()]
+        if not self.updates:
+            raise ValueError(f"{path}: нет обновлений")
+
+    def update(self, seq: int) -> dict:
+        update = copy.deepcopy(self.updates[seq % len(self.updates)])
+        update.pop("update_id", None)
+        if "message" in update:
+            update["message"]["message_id"] = seq
+            update["message"]["date"] = int(time.time())
+        elif "inline_query" in update:
+            update["inline_query"]["id"] = str(seq)
+        return update
+
+
+def _update_key(update: dict):
+    if "message" in update:
+        return "message", update["message"]["chat"]["id"], update["message"]["message_id"]
+    if "inline_query" in update:
+        return "inline", update["inline_query"]["id"]
+    return None
+
+
+class Recorder:
+    """
+    Время подачи каждого обновления и первого ответа на него
+    """
+
+    def __init__(self):
+        self.sent = {}
+        self.replied = {}
+        self.errors = set()
+        self.photos = 0
+        self.delivery_failures = 0
+        self._lock = threading.Lock()
+
+    def expect(self, key, at: float):
+        with self._lock:
+            self.sent[key] = at
+
+    def failed(self, key):
+        with self._lock:
+            self.delivery_failures += 1
+            self.sent.pop(key, None)
+
+    def on_send(self, method: str, params: dict, at: float):
+        if method == "sendPhoto":
+            with self._lock:
+                self.photos += 1
+            return
+        if method == "answerInlineQuery":
+            key = "inline", params["inline_query_id"]
+        else:
+            reply = params.get("reply_parameters")
+            if not reply:
+                return
+            if isinstance(reply, str):
+                reply = json.loads(reply)
+            key = "message", int(params["chat_id"]), reply["message_id"]
+        with self._lock:
+            self.replied.setdefault(key, at)
+            if ERROR_REPLY in params.get("text", ""):
+                self.errors.add(key)
+
+    def outstanding(self, keys) -> int:
+        with self._lock:
+            return sum(1 for key in keys if key in self.sent and key not in self.replied)
+
+
+class BotProcess:
+    """
+    main.py в отдельном процессе, направленный на FakeBotAPI
+    """
+
+    def __init__(self, api: FakeBotAPI, mode: str, processes: int, env: dict, workdir: str):
+        self.api = api
+        self.mode = mode
+        self.webhook_port = _free_port()
+        self.webhook_url = f"http://127.0.0.1:{self.webhook_port}/webhook"
+        self.secret = secrets.token_hex(16)
+        self.log_path = os.path.join(workdir, "bot.log")
+        self.env = {
+            **os.environ,
+            "BOT_TOKEN": TOKEN,
+            "BOT_MODE": mode,
+            "BOT_PROCESSES": str(processes),
+            "TELEGRAM_API_URL": api.api_url,
+            "IMAGE_URL": api.base_url + "/image.png",
+            "IMAGE_CACHE_DIR": os.path.join(workdir, "cache"),
+            "SUBSCRIBERS_DB": os.path.join(workdir, "subscribers.db"),
+            "METRICS_PORT": "0",
+            "WEBHOOK_HOST": "127.0.0.1",
+            "WEBHOOK_PORT": str(self.webhook_port),
+            "WEBHOOK_PATH": "/webhook",
+            "WEBHOOK_URL": f"http://127.0.0.1:{self.webhook_port}",
+            "WEBHOOK_SECRET": self.secret,
+            **env,
+        }
+        self._log = None
+        self.process = None
+
+    def start(self, timeout: float = 120):
+        self._log = open(self.log_path, "wb")
+        self.process = subprocess.Popen([sys.executable, "main.py"], cwd=ROOT, env=self.env,
+                                        stdout=self._log, stderr=subprocess.STDOUT)
+        deadline = time.monotonic() + timeout
+        # Готовность: первый getUpdates (polling) или setWebhook (webhook)
+        while not self.api.ready.wait(0.2):
+            self._check(deadline)
+        if self.mode == "webhook":
+            while True:
+                try:
+                    socket.create_connection(("127.0.0.1", self.webhook_port), timeout=1).close()
+                    break
+                except OSError:
+                    self._check(deadline)
+                    time.sleep(0.2)
+
+    def _check(self, deadline: float):
+        if self.process.poll() is not None:
+            raise RuntimeError(f"Бот завершился с кодом {self.process.returncode}, см. {self.log_path}")
+        if time.monotonic() > deadline:
+            raise RuntimeError(f"Бот не запустился, см. {self.log_path}")
+
+    def stop(self, timeout: float = 30):
+        self.process.send_signal(signal.SIGTERM)
+        # Висящий long polling отпускаем сразу, не дожидаясь его таймаута
+        self.api.release_pollers()
+        try:
+            self.process.wait(timeout)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+            self.process.wait()
+        self._log.close()
+
+
+class LoadGenerator:
+    def __init__(self, api: FakeBotAPI, recorder: Recorder, source, mode: str, bot: BotProcess,
+                 senders: int = 16):
+        self.api = api
+        self.recorder = recorder
+        self.source = source
+        self.mode = mode
+        self.bot = bot
+        self._seq = 0
+        self._local = threading.local()
+        self._pool = ThreadPoolExecutor(max_workers=senders, thread_name_prefix="loadgen")
+
+    def _post(self, key, update: dict):
+        session = getattr(self._local, "session", None)
+        if session is None:
+            session = self._local.session = requests.Session()
+        try:
+            response = session.post(self.bot.webhook_url, json=update, timeout=10,
+                                    headers={SECRET_HEADER: self.bot.secret})
+            ok = response.status_code == 200
+        except requests.RequestException:
+            ok = False
+        if not ok:
+            self.recorder.failed(key)
+
+    def _deliver(self):
+        self._seq += 1
+        update = self.source.update(self._seq)
+        key = _update_key(update)
+        if self.mode == "webhook":
+            update["update_id"] = self._seq
+            self.recorder.expect(key, time.perf_counter())
+            self._pool.submit(self._post, key, update)
+        else:
+            self.recorder.expect(key, time.perf_counter())
+            self.api.push_update(update)
+        return key
+
+    def step(self, rate: float, duration: float, drain: float) -> dict:
+        """
+        Открытая нагрузка: обновления подаются по расписанию, не дожидаясь ответов
+        """
+        throttled, photos = self.api.throttled, self.recorder.photos
+        keys = []
+        count = max(int(rate * duration), 1)
+        start = time.perf_counter()
+        for i in range(count):
+            delay = start + i / rate - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            keys.append(self._deliver())
+        offered_end = time.perf_counter()
+
+        deadline = time.monotonic() + drain
+        while self.recorder.outstanding(keys) and time.monotonic() < deadline:
+            time.sleep(0.05)
+
+        sent = self.recorder.sent
+        replied = self.recorder.replied
+        delivered = [key for key in keys if key in sent]
+        answered = [key for key in delivered if key in replied]
+        latencies = sorted(replied[key] - sent[key] for key in answered)
+        finished = max((replied[key] for key in answered), default=offered_end)
+        errors = sum(1 for key in answered if key in self.recorder.errors)
+        failed = count - len(answered) + errors
+        return {
+            "rate": rate,
+            "offered": count / max(offered_end - start, 1e-9),
+            "sent": count,
+            "answered": len(answered),
+            "throughput": len(answered) / max(finished - start, 1e-9),
+            "p50": _percentile(latencies, 0.50),
+            "p90": _percentile(latencies, 0.90),
+            "p99": _percentile(latencies, 0.99),
+            "max": latencies[-1] if latencies else float("nan"),
+            "unanswered": len(delivered) - len(answered),
+            "delivery_failures": count - len(delivered),
+            "error_replies": errors,
+            "error_rate": failed / count,
+            "throttled": self.api.throttled - throttled,
+            "photos": self.recorder.photos - photos,
+        }
+
+    def shutdown(self):
+        self._pool.shutdown()
+
+
+def saturated(result: dict, slo: float) -> bool:
+    return (
+        result["throughput"] < 0.9 * result["offered"]
+        or result["error_rate"] > 0.01
+        or not result["p99"] <= slo
+    )
+
+
+def print_report(results: list, slo: float):
+    print(f"{'частота':>8} {'подано/с':>9} {'ответов/с':>10} {'p50 мс':>8} {'p90 мс':>8} "
+          f"{'p99 мс':>8} {'max мс':>8} {'ошибки':>7} {'429':>5}")
+    saturation = None
+    for result in results:
+        mark = ""
+        if saturation is None and saturated(result, slo):
+            saturation = result["rate"]
+            mark = "  ← насыщение"
+        print(f"{result['rate']:8g} {result['offered']:9.1f} {result['throughput']:10.1f} "
+              f"{result['p50'] * 1000:8.1f} {result['p90'] * 1000:8.1f} {result['p99'] * 1000:8.1f} "
+              f"{result['max'] * 1000:8.1f} {result['error_rate']:7.1%} {result['throttled']:5d}{mark}")
+    if saturation is None:
+        print(f"Насыщение не достигнуто (критерий: ответов < 90% поданных, ошибок > 1% или p99 > {slo}с)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Нагрузочный прогон main.py против заглушки Bot API")
+    parser.add_argument("--mode", choices=["polling", "webhook"], default="polling")
+    parser.add_argument("--processes", type=int, default=1, help="BOT_PROCESSES бота")
+    parser.add_argument("--env", action="append", default=[], metavar="KEY=VALUE",
+                        help="дополнительные переменные окружения бота")
+    parser.add_argument("--rates", default="10,20,40", help="ступени частоты, обновлений/с")
+    parser.add_argument("--duration", type=float, default=20, help="длительность ступени, с")
+    parser.add_argument("--drain", type=float, default=15, help="ожидание ответов после ступени, с")
+    parser.add_argument("--warmup", type=float, default=3, help="разогрев на первой частоте, с")
+    parser.add_argument("--replay", help="JSONL с записанными Update вместо синтетики")
+    parser.add_argument("--users", type=int, default=10000, help="число синтетических пользователей")
+    parser.add_argument("--slo", type=float, default=1.0, help="допустимый p99, с")
+    parser.add_argument("--latency", type=float, default=0.0, help="задержка ответов Bot API, с")
+    parser.add_argument("--jitter", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="доля отправок с ответом 429")
+    parser.add_argument("--global-rate", type=float, default=None, help="лимит отправок Bot API в секунду")
+    parser.add_argument("--json", help="сохранить результаты в файл")
+    args = parser.parse_args()
+
+    rates = [float(rate) for rate in args.rates.split(",")]
+    env = dict(item.split("=", 1) for item in args.env)
+    source = Replay(args.replay) if args.replay else Synthetic(args.users)
+    recorder = Recorder()
+    api = FakeBotAPI(port=0, latency=args.latency, jitter=args.jitter, error_rate=args.error_rate,
+                     global_rate=args.global_rate, on_send=recorder.on_send).start()
+
+    with tempfile.TemporaryDirectory(prefix="loadgen-") as workdir:
+        bot = BotProcess(api, args.mode, args.processes, env, workdir)
+        print(f"Запуск бота: режим {args.mode}, процессов {args.processes}, журнал {bot.log_path}")
+        bot.start()
+        generator = LoadGenerator(api, recorder, source, args.mode, bot)
+        try:
+            if args.warmup:
+                generator.step(rates[0], args.warmup, args.drain)
+            results = []
+            for rate in rates:
+                result = generator.step(rate, args.duration, args.drain)
+                results.append(result)
+                print(f"ступень {rate:g}/с: ответов {result['answered']}/{result['sent']}, "
+                      f"p99 {result['p99'] * 1000:.1f} мс", flush=True)
+        finally:
+            generator.shutdown()
+            bot.stop()
+            api.stop()
+
+    print()
+    print_report(results, args.slo)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"mode": args.mode, "processes": args.processes, "env": env, "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,12 +1,28 @@
 import os
 import logging
-import io
+import multiprocessing
+import signal
+import threading
 from datetime import datetime
+from functools import partial
 
-import requests
+import pytz
 import telebot
 
-from matrix import calculate_matrix
+from matrix_index import get_index
+from daily_cache import DailyHoroscopeCache
+from dispatcher import DispatchingTeleBot
+from images import ImageDelivery
+from webhook import WebhookServer
+import metrics
+from metrics import RequestTimer
+from sender import SendScheduler
+from subscribers import SubscriberStore
+from broadcast import BroadcastScheduler
+from cluster import ClusterTeleBot, ProcessCluster
+from compatibility import build_compatibility_text, parse_dates
+from inline import InlineAnswers
+from render_cache import register
 from horoscope import build_matrix_text, build_tasks_text, daily_horoscope
 
 # Настройка логирования
@@ -22,66 +38,302 @@ if not BOT_TOKEN:
     logger.error("BOT_TOKEN не задан в окружении!")
     exit(1)
 
-bot = telebot.TeleBot(BOT_TOKEN, parse_mode='Markdown')
+# Адрес Bot API в формате telebot.apihelper.API_URL; для прогонов — fake_api.py
+TELEGRAM_API_URL = os.getenv("TELEGRAM_API_URL")
+if TELEGRAM_API_URL:
+    telebot.apihelper.API_URL = TELEGRAM_API_URL
+
+# Режим получения обновлений: polling или webhook
+BOT_MODE = os.getenv("BOT_MODE", "polling")
+WEBHOOK_URL = os.getenv("WEBHOOK_URL")
+WEBHOOK_HOST = os.getenv("WEBHOOK_HOST", "0.0.0.0")
+WEBHOOK_PORT = int(os.getenv("WEBHOOK_PORT", "8080"))
+WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "/webhook")
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET")
+
+# Локальный эндпоинт метрик Prometheus; METRICS_PORT=0 — выключен
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+METRICS_PORT = int(os.getenv("METRICS_PORT", "9100"))
+
+# Число процессов-обработчиков; больше 1 — многопроцессный режим
+BOT_PROCESSES = int(os.getenv("BOT_PROCESSES", "1"))
+
+# Пул обработчиков: BOT_WORKERS=0 — обработка прямо в потоке опроса (или вебхука)
+BOT_WORKERS = int(os.getenv("BOT_WORKERS", "4"))
+BOT_QUEUE_SIZE = int(os.getenv("BOT_QUEUE_SIZE", "1000"))
+
+# Процесс-диспетчер многопроцессного режима: сам обновления не обрабатывает,
+# только раздаёт их процессам и ведёт рассылку
+CLUSTER_DISPATCHER = BOT_PROCESSES > 1 and multiprocessing.parent_process() is None
+
+if BOT_WORKERS > 0 and not CLUSTER_DISPATCHER:
+    bot = DispatchingTeleBot(BOT_TOKEN, workers=BOT_WORKERS, queue_size=BOT_QUEUE_SIZE, parse_mode='Markdown')
+else:
+    # threaded=False: без собственного пула telebot, обработчики — в потоке приёма
+    bot = telebot.TeleBot(BOT_TOKEN, parse_mode='Markdown', threaded=False)
+
+# Все исходящие сообщения идут через планировщик с лимитами Telegram
+SEND_GLOBAL_RATE = float(os.getenv("SEND_GLOBAL_RATE", "30"))
+SEND_CHAT_RATE = float(os.getenv("SEND_CHAT_RATE", "1"))
+SEND_THREADS = int(os.getenv("SEND_THREADS", "8"))
+
+# В многопроцессном режиме лимит делится поровну между диспетчером (рассылка)
+# и процессами; процессы получают уже свою долю через окружение (run_cluster)
+if CLUSTER_DISPATCHER:
+    SEND_GLOBAL_RATE /= BOT_PROCESSES + 1
+
+sender = SendScheduler(bot, SEND_GLOBAL_RATE, SEND_CHAT_RATE, threads=SEND_THREADS)
+
+# Индекс матриц строится (или загружается из MATRIX_INDEX_PATH) при старте
+matrix_index = get_index()
+
+# Варианты гороскопа на день; смена дня по BOT_TIMEZONE
+daily_cache = DailyHoroscopeCache(daily_horoscope)
+
+# Подписчики ежедневной рассылки
+subscribers = SubscriberStore()
+broadcaster = BroadcastScheduler(subscribers, sender, daily_cache)
+
+# Готовые ответы inline-режима (@bot ДД.ММ.ГГГГ)
+inline_answers = register(InlineAnswers(matrix_index.view, daily_cache))
+
+# Картинка к ответу: локальный кэш + file_id Telegram
+image_delivery = ImageDelivery()
+
+metrics.track_render_caches()
+if isinstance(bot, DispatchingTeleBot):
+    metrics.QUEUE_DEPTH.set_function(bot.dispatcher.depth, "workers")
+metrics.QUEUE_DEPTH.set_function(sender.depth, "outbound")
 
 @bot.message_handler(commands=['start', 'help'])
 def send_welcome(message):
-    bot.reply_to(
+    sender.reply_to(
         message,
         "🔮 *Персональный Оракул: Матрица Судьбы*\n\n"
         "Отправь дату рождения в формате:\n"
         "*ДД.ММ.ГГГГ*\n\n"
         "Пример: *15.05.1990*\n\n"
-        "Я рассчитаю твою матрицу судьбы и дам персональный прогноз на сегодня."
+        "Я рассчитаю твою матрицу судьбы и дам персональный прогноз на сегодня.\n\n"
+        "Ежедневный прогноз: */subscribe ДД.ММ.ГГГГ*\n"
+        "Совместимость группы: */compat ДД.ММ.ГГГГ ДД.ММ.ГГГГ ...*\n"
+        "В любом чате: *@бот ДД.ММ.ГГГГ*"
     )
 
+@bot.message_handler(commands=['subscribe'])
+def handle_subscribe(message):
+    args = message.text.split()[1:]
+    try:
+        date_str = args[0]
+        datetime.strptime(date_str, "%d.%m.%Y")
+        timezone = args[1] if len(args) > 1 else daily_cache.timezone.zone
+        pytz.timezone(timezone)
+    except (IndexError, ValueError, pytz.UnknownTimeZoneError):
+        sender.reply_to(
+            message,
+            "Используйте: */subscribe ДД.ММ.ГГГГ [часовой пояс]*\n"
+            "Пример: */subscribe 15.05.1990 Europe/Moscow*"
+        )
+        return
+
+    matrix_data = matrix_index.view(date_str)
+    subscribers.subscribe(message.chat.id, date_str, timezone, matrix_data["second"], matrix_data["fourth"])
+    sender.reply_to(
+        message,
+        f"🔔 Подписка оформлена: прогноз будет приходить каждый день в {broadcaster.hour}:00 ({timezone})"
+    )
+
+@bot.message_handler(commands=['unsubscribe'])
+def handle_unsubscribe(message):
+    if subscribers.unsubscribe(message.chat.id):
+        sender.reply_to(message, "🔕 Подписка отменена")
+    else:
+        sender.reply_to(message, "Вы не подписаны на рассылку")
+
+def _reply_failed(message, future):
+    # Telegram отклонил ответ — пользователь хотя бы узнаёт об ошибке
+    if future.exception() is None:
+        return
+    try:
+        sender.reply_to(message, "❌ *Произошла ошибка при расчете*")
+    except RuntimeError:
+        # Планировщик уже остановлен
+        pass
+
+@bot.message_handler(commands=['compat'])
+def handle_compat(message):
+    timer = RequestTimer("handle_compat")
+    try:
+        with timer.stage("parse"):
+            dates = parse_dates(message.text)
+        if len(dates) < 2:
+            sender.reply_to(
+                message,
+                "Используйте: */compat ДД.ММ.ГГГГ ДД.ММ.ГГГГ ...*\n"
+                "Нужно минимум две разные даты рождения"
+            )
+            return
+
+        with timer.stage("render"):
+            text = build_compatibility_text(dates, matrix_index.view)
+
+        with timer.stage("reply"):
+            future = sender.reply_to(message, text)
+        future.add_done_callback(partial(_reply_failed, message))
+        timer.finish_after(future)
+    except Exception as e:
+        metrics.ERRORS.inc(type(e).__name__)
+        logger.error(f"Ошибка: {e}")
+        sender.reply_to(message, "❌ *Произошла ошибка при расчете*")
+    finally:
+        timer.finish()
+
+@bot.inline_handler(func=lambda query: True)
+def handle_inline(query):
+    timer = RequestTimer("handle_inline")
+    try:
+        with timer.stage("render"):
+            answer = inline_answers.answer(query.query)
+
+        # Мимо SendScheduler: на ответы inline-запросам лимиты сообщений не действуют,
+        # а ждать в очереди за рассылкой им нельзя
+        with timer.stage("reply"):
+            bot.answer_inline_query(query.id, **answer)
+    except Exception as e:
+        metrics.ERRORS.inc(type(e).__name__)
+        logger.error(f"Ошибка inline-запроса: {e}")
+    finally:
+        timer.finish()
+
 @bot.message_handler(func=lambda message: True)
 def handle_date(message):
+    timer = RequestTimer("handle_date")
     try:
-        date_str = message.text.strip()
-        datetime.strptime(date_str, "%d.%m.%Y")
+        with timer.stage("parse"):
+            date_str = message.text.strip()
+            datetime.strptime(date_str, "%d.%m.%Y")
         
         # Рассчитываем матрицу
-        matrix_data = calculate_matrix(date_str)
+        with timer.stage("calculate"):
+            matrix_data = matrix_index.view(date_str)
         
         # Формируем текст как в оригинале
-        text = (
-            daily_horoscope(matrix_data)
-            + "\n\n"
-            + build_tasks_text(matrix_data)
-            + "\n"
-            + build_matrix_text(matrix_data)
-        )
+        with timer.stage("render"):
+            text = (
+                daily_cache.get(matrix_data)
+                + "\n\n"
+                + build_tasks_text(matrix_data)
+                + "\n"
+                + build_matrix_text(matrix_data)
+            )
         
-        bot.reply_to(message, text)
+        with timer.stage("reply"):
+            future = sender.reply_to(message, text)
+        future.add_done_callback(partial(_reply_failed, message))
+        timer.finish_after(future)
         
-        # Пробуем отправить изображение (по желанию)
-        try:
-            image_url = "https://image.pollinations.ai/prompt/mystical%20tarot%20card%20esoteric%20symbols%20golden%20light.png"
-            response = requests.get(image_url, timeout=10)
-            response.raise_for_status()
-            
-            if response.headers.get('content-type', '').startswith('image/'):
-                bot.send_photo(
-                    message.chat.id,
-                    photo=io.BytesIO(response.content),
-                    caption="🎴 *Ваша персональная энергетическая карта*"
-                )
-        except Exception as e:
-            logger.debug(f"Изображение не загрузилось: {e}")
-            # Это нормально, пропускаем
+        # Картинка уходит в фоне, из кэша или по file_id
+        image_delivery.send_async(sender, message.chat.id)
             
     except ValueError:
-        bot.reply_to(
+        metrics.INVALID_INPUT.inc()
+        sender.reply_to(
             message,
             "❌ *Ошибка формата*\n\n"
             "Используйте: *ДД.ММ.ГГГГ*\n"
             "Пример: *15.05.1990*"
         )
     except Exception as e:
+        metrics.ERRORS.inc(type(e).__name__)
         logger.error(f"Ошибка: {e}")
-        bot.reply_to(message, "❌ *Произошла ошибка при расчете*")
+        sender.reply_to(message, "❌ *Произошла ошибка при расчете*")
+    finally:
+        timer.finish()
+
+stop_event = threading.Event()
+receiver = None
+
+
+def shutdown(signum=None, frame=None):
+    logger.info("Остановка бота...")
+    bot.stop_polling()
+    if receiver is not None:
+        receiver.stop_polling()
+    stop_event.set()
+
+
+def drain():
+    broadcaster.stop()
+    # Дожидаемся обработки уже принятых обновлений
+    if isinstance(bot, DispatchingTeleBot):
+        bot.shutdown()
+    image_delivery.shutdown()
+    sender.shutdown()
+
+
+def start_polling(receiver):
+    # После BOT_MODE=webhook Telegram отвечает на getUpdates 409, пока вебхук не снят;
+    # infinity_polling сам его не снимает
+    receiver.remove_webhook()
+    receiver.infinity_polling()
+
+
+def run_polling():
+    if isinstance(bot, DispatchingTeleBot):
+        bot.start_workers()
+    try:
+        start_polling(bot)
+    finally:
+        drain()
+
+
+def run_webhook(receiver=None):
+    server = WebhookServer(receiver or bot, WEBHOOK_HOST, WEBHOOK_PORT, WEBHOOK_PATH, WEBHOOK_SECRET)
+    metrics.QUEUE_DEPTH.set_function(server.depth, "webhook")
+    if WEBHOOK_URL:
+        server.set_webhook(WEBHOOK_URL)
+    if receiver is None and isinstance(bot, DispatchingTeleBot):
+        bot.start_workers()
+    server.start()
+    try:
+        stop_event.wait()
+    finally:
+        server.stop()
+        if receiver is None:
+            drain()
+
+
+def run_cluster():
+    global receiver
+    # Процессы получают индекс из файла и свою долю глобального лимита отправки
+    if not os.getenv("MATRIX_INDEX_PATH"):
+        os.environ["MATRIX_INDEX_PATH"] = os.path.abspath("matrix_index.bin")
+        matrix_index.save(os.environ["MATRIX_INDEX_PATH"])
+    os.environ["SEND_GLOBAL_RATE"] = str(SEND_GLOBAL_RATE)
+
+    cluster = ProcessCluster(BOT_PROCESSES, queue_size=BOT_QUEUE_SIZE).start()
+    metrics.QUEUE_DEPTH.set_function(cluster.depth, "processes")
+    receiver = ClusterTeleBot(BOT_TOKEN, cluster)
+    try:
+        if BOT_MODE == "webhook":
+            run_webhook(receiver)
+        else:
+            start_polling(receiver)
+    finally:
+        cluster.shutdown()
+        drain()
+
 
 if __name__ == '__main__':
     logger.info("Бот запущен...")
-    bot.infinity_polling()
+    signal.signal(signal.SIGTERM, shutdown)
+    daily_cache.start_prewarm()
+    image_delivery.prefetch()
+    broadcaster.start()
+    if METRICS_PORT:
+        metrics.start_server(METRICS_HOST, METRICS_PORT)
+    if BOT_PROCESSES > 1:
+        run_cluster()
+    elif BOT_MODE == "webhook":
+        run_webhook()
+    else:
+        run_polling()
@@ -1,33 +1,83 @@
 from datetime import datetime
-from values import matrix, tasks
+from catalog import matrix, tasks
+from render_cache import RenderCache, register
 
+_matrix_cache = register(RenderCache("matrix.matrix"))
+_tasks_cache = register(RenderCache("matrix.tasks"))
 
-def get_matrix_value(full_array, number: int) -> str:
+
+def _digits(number: int) -> list:
+    return [int(d) for d in str(abs(number))]
+
+
+def calculate_matrix(date_str: str) -> dict:
     """
-    Абсолютно идентично getMatrixValue из App.tsx
+    Расчёт психоматрицы Пифагора по дате ДД.ММ.ГГГГ.
+    Рабочие числа сводятся к 1–9 (ключи tasks), "full" — все цифры матрицы.
+    """
+    day, month, year = date_str.split(".")
+    date_digits = [int(d) for d in day + month + year]
+
+    first = sum(date_digits)
+    second = first % 9 or 9
+    # Первая ненулевая цифра дня, умноженная на 2
+    third = abs(first - 2 * int(day.lstrip("0")[0]))
+    fourth = third % 9 or 9
+
+    full = date_digits + _digits(first) + _digits(second) + _digits(third) + _digits(fourth)
+
+    return {
+        "first": first,
+        "second": second,
+        "third": third,
+        "fourth": fourth,
+        "full": full,
+        "counts": count_digits(full),
+    }
+
+
+def count_digits(full_array) -> tuple:
+    """
+    Количество каждой цифры 1–9 в матрице за один проход
     """
-    count = full_array.count(number)
+    counts = [0] * 10
+    for digit in full_array:
+        counts[digit] += 1
+    return tuple(counts[1:])
 
+
+def matrix_key(number: int, count: int) -> str:
+    """
+    Ключ values.matrix для цифры, встречающейся count раз
+    """
     if count == 0:
-        key = f"{number}0"
-    elif count > 5:
-        key = str(number) * (count - 5)
-    else:
-        key = str(number) * count
+        return f"{number}0"
+    if count > 5:
+        return str(number) * (count - 5)
+    return str(number) * count
 
-    return matrix.get(key, "—")
 
+def _matrix_value(number: int, count: int) -> str:
+    return matrix.get(matrix_key(number, count), "—")
 
-def build_matrix_text(matrix_data):
-    full = matrix_data["full"]
 
-    text = "🔢 *МАТРИЦА СУДЬБЫ*\n\n"
+def get_matrix_value(full_array, number: int) -> str:
+    """
+    Абсолютно идентично getMatrixValue из App.tsx
+    """
+    return _matrix_value(number, full_array.count(number))
+
+
+def _counts(matrix_data) -> tuple:
+    counts = matrix_data.get("counts")
+    return counts if counts is not None else count_digits(matrix_data["full"])
+
+
+def _render_matrix_text(counts) -> str:
+    parts = ["🔢 *МАТРИЦА СУДЬБЫ*\n\n"]
     
     # Красивое отображение матрицы
-    for n in range(1, 10):
-        count = full.count(n)
-        value = get_matrix_value(full, n)
-        
+    for n, count in enumerate(counts, 1):
         # Определяем уровень энергии
         if count == 0:
             level = "⚪ Отсутствует"
@@ -37,42 +87,52 @@ def build_matrix_text(matrix_data):
             level = "🟠 Усиленная"
         elif count == 3:
             level = "🔴 Сильная"
-        elif count >= 4:
+        else:
             level = "🟣 Очень сильная"
         
-        text += f"*{n}* ({count}шт, {level}):\n"
-        text += f"{value}\n\n"
+        parts.append(f"*{n}* ({count}шт, {level}):\n{_matrix_value(n, count)}\n\n")
 
-    return text
+    return "".join(parts)
 
 
-def build_tasks_text(matrix_data):
-    soul_task = tasks.get(str(matrix_data["second"]), "")
-    clan_task = tasks.get(str(matrix_data["fourth"]), "")
+def build_matrix_text(matrix_data):
+    counts = _counts(matrix_data)
+    return _matrix_cache.get_or_render(counts, _render_matrix_text, counts)
+
 
-    text = "🎯 *КАРМИЧЕСКИЕ ЗАДАЧИ*\n\n"
+def _render_tasks_text(second, fourth) -> str:
+    soul_task = tasks.get(str(second), "")
+    clan_task = tasks.get(str(fourth), "")
+
+    parts = ["🎯 *КАРМИЧЕСКИЕ ЗАДАЧИ*\n\n"]
     
     if soul_task:
-        text += f"*Душа (число {matrix_data['second']}):*\n"
-        text += f"✨ {soul_task}\n\n"
+        parts.append(f"*Душа (число {second}):*\n✨ {soul_task}\n\n")
     
     if clan_task:
-        text += f"*Род (число {matrix_data['fourth']}):*\n"
-        text += f"🏛 {clan_task}\n\n"
+        parts.append(f"*Род (число {fourth}):*\n🏛 {clan_task}\n\n")
     
     # Добавляем рекомендации
-    text += "*Рекомендации:*\n"
-    text += "• Эти задачи — ваш путь к гармонии\n"
-    text += "• Каждое их выполнение приносит удовлетворение\n"
-    text += "• Обращайте внимание на повторяющиеся ситуации\n"
+    parts.append(
+        "*Рекомендации:*\n"
+        "• Эти задачи — ваш путь к гармонии\n"
+        "• Каждое их выполнение приносит удовлетворение\n"
+        "• Обращайте внимание на повторяющиеся ситуации\n"
+    )
+
+    return "".join(parts)
 
-    return text
+
+def build_tasks_text(matrix_data):
+    key = (matrix_data["second"], matrix_data["fourth"])
+    return _tasks_cache.get_or_render(key, _render_tasks_text, *key)
 
 
-def daily_horoscope(matrix_data):
-    today = datetime.now().strftime("%d.%m.%Y")
-    current_day = datetime.now().day
-    current_month = datetime.now().month
+def daily_horoscope(matrix_data, day=None):
+    day = day or datetime.now()
+    today = day.strftime("%d.%m.%Y")
+    current_day = day.day
+    current_month = day.month
     
     # Рассчитываем энергию дня
     day_energy = (current_day + current_month) % 9 or 9
@@ -0,0 +1,312 @@
+"""
+Предрасчитанный индекс матриц по дате рождения (1900–2100).
+
+calculate_matrix — чистая функция даты, поэтому все ~73 тыс. дат считаются
+один раз. Таблица хранится в array("Q"): одна ячейка на день, в ней упакованы
+девять счётчиков цифр, second / fourth (по 4 бита) и first / third (по 6 бит),
+всего 56 бит.
+
+Формат файла (little-endian):
+    заголовок  b"MBIX", версия u16, ординал первой даты u32, число дат u32,
+               отпечаток calculate_matrix u32
+    данные     ячейки u64
+
+Отпечаток — CRC32 ячеек контрольных дат, посчитанных текущим
+calculate_matrix: файл от другой версии расчёта не загружается, а
+пересобирается (как и файл старше matrix.py).
+"""
+import logging
+import os
+import struct
+import sys
+import zlib
+from array import array
+from datetime import date, timedelta
+from types import MappingProxyType
+
+from matrix import calculate_matrix, count_digits
+
+logger = logging.getLogger(__name__)
+
+FIRST_DATE = date(1900, 1, 1)
+LAST_DATE = date(2100, 12, 31)
+
+MAGIC = b"MBIX"
+VERSION = 2
+
+_HEADER = struct.Struct("<4sHIII")
+SOURCES = [os.path.join(os.path.dirname(os.path.abspath(__file__)), "matrix.py")]
+
+_BASE = FIRST_DATE.toordinal()
+_SIZE = LAST_DATE.toordinal() - _BASE + 1
+
+# Раскладка битов: счётчики 1–9 в битах 0–35, second — 36–39, fourth — 40–43,
+# first — 44–49, third — 50–55 (оба не больше 48)
+_BITS = 4
+_NIBBLE = 0xF
+_SIX_BITS = 0x3F
+_COUNTS_MASK = (1 << 9 * _BITS) - 1
+_SECOND_SHIFT = 9 * _BITS
+_FOURTH_SHIFT = 10 * _BITS
+_FIRST_SHIFT = 11 * _BITS
+_THIRD_SHIFT = _FIRST_SHIFT + 6
+# counts, second и fourth — всё, что нужно для ответа бота
+_VIEW_MASK = (1 << _FIRST_SHIFT) - 1
+
+# Контрольные даты для отпечатка: каждая 97-я, ~750 штук
+_PROBE_STEP = 97
+
+
+def pack(second: int, fourth: int, counts, first: int = 0, third: int = 0) -> int:
+    packed = (second << _SECOND_SHIFT) | (fourth << _FOURTH_SHIFT) | (first << _FIRST_SHIFT) | (third << _THIRD_SHIFT)
+    for i, count in enumerate(counts):
+        packed |= count << (i * _BITS)
+    return packed
+
+
+def _pack_day(day: date) -> int:
+    data = calculate_matrix(day.strftime("%d.%m.%Y"))
+    return pack(data["second"], data["fourth"], count_digits(data["full"]), data["first"], data["third"])
+
+
+def pack_counts(counts) -> int:
+    return pack(0, 0, counts)
+
+
+def unpack_second(packed: int) -> int:
+    return (packed >> _SECOND_SHIFT) & _NIBBLE
+
+
+def unpack_fourth(packed: int) -> int:
+    return (packed >> _FOURTH_SHIFT) & _NIBBLE
+
+
+def unpack_first(packed: int) -> int:
+    return (packed >> _FIRST_SHIFT) & _SIX_BITS
+
+
+def unpack_third(packed: int) -> int:
+    return (packed >> _THIRD_SHIFT) & _SIX_BITS
+
+
+def unpack_counts(packed: int) -> tuple:
+    return tuple((packed >> (i * _BITS)) & _NIBBLE for i in range(9))
+
+
+def fingerprint() -> int:
+    """
+    CRC32 ячеек контрольных дат по текущему calculate_matrix
+    """
+    probes = array("Q", (_pack_day(date.fromordinal(_BASE + offset)) for offset in range(0, _SIZE, _PROBE_STEP)))
+    return zlib.crc32(_little_endian(probes))
+
+
+def _little_endian(table: array) -> bytes:
+    if sys.byteorder == "big":
+        table = array("Q", table)
+        table.byteswap()
+    return table.tobytes()
+
+
+def _parse(date_str: str) -> date:
+    day, month, year = date_str.split(".")
+    return date(int(year), int(month), int(day))
+
+
+class MatrixIndex:
+    """
+    Таблица упакованных матриц с O(1)-поиском по дате и обратными запросами
+    """
+
+    def __init__(self, table: array):
+        if len(table) != _SIZE:
+            raise ValueError(f"Неверный размер индекса: {len(table)} вместо {_SIZE}")
+        self._table = table
+        # Общие неизменяемые представления counts/second/fourth, по одному на ячейку
+        self._views = {}
+        # Обратные индексы строятся лениво, при первом запросе
+        self._by_counts = None
+        self._by_second = None
+        self._by_fourth = None
+
+    @classmethod
+    def build(cls) -> "MatrixIndex":
+        table = array("Q", bytes(8 * _SIZE))
+        day = FIRST_DATE
+        for offset in range(_SIZE):
+            table[offset] = _pack_day(day)
+            day += timedelta(days=1)
+        return cls(table)
+
+    @classmethod
+    def load(cls, path: str) -> "MatrixIndex":
+        """
+        Загружает индекс; ValueError, если файл другого формата, диапазона
+        дат или построен другой версией calculate_matrix
+        """
+        with open(path, "rb") as f:
+            header = f.read(_HEADER.size)
+            if len(header) != _HEADER.size:
+                raise ValueError(f"{path}: не индекс матриц")
+            magic, version, base, size, crc = _HEADER.unpack(header)
+            if magic != MAGIC or version != VERSION:
+                raise ValueError(f"{path}: не индекс матриц версии {VERSION}")
+            if base != _BASE or size != _SIZE:
+                raise ValueError(f"{path}: другой диапазон дат")
+            if crc != fingerprint():
+                raise ValueError(f"{path}: построен другой версией calculate_matrix")
+            table = array("Q")
+            try:
+                table.fromfile(f, _SIZE)
+            except EOFError:
+                raise ValueError(f"{path}: файл обрезан")
+        if sys.byteorder == "big":
+            table.byteswap()
+        return cls(table)
+
+    def save(self, path: str):
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(_HEADER.pack(MAGIC, VERSION, _BASE, _SIZE, fingerprint()))
+            f.write(_little_endian(self._table))
+        # Атомарная замена: параллельно стартующие процессы не увидят полфайла
+        os.replace(tmp_path, path)
+
+    def __len__(self):
+        return _SIZE
+
+    def __contains__(self, day: date):
+        return FIRST_DATE <= day <= LAST_DATE
+
+    def packed(self, day: date) -> int:
+        offset = day.toordinal() - _BASE
+        if not 0 <= offset < _SIZE:
+            raise KeyError(day)
+        return self._table[offset]
+
+    def view(self, date_str: str):
+        """
+        Только counts / second / fourth — всё, что нужно для ответа бота.
+        Возвращает общий неизменяемый словарь: одинаковые ячейки делят один
+        объект, новых данных на запрос не создаётся. Даты вне индекса
+        считаются напрямую.
+        """
+        day = _parse(date_str)
+        if day not in self:
+            return calculate_matrix(date_str)
+
+        key = self.packed(day) & _VIEW_MASK
+        view = self._views.get(key)
+        if view is None:
+            view = self._views.setdefault(key, MappingProxyType({
+                "second": unpack_second(key),
+                "fourth": unpack_fourth(key),
+                "counts": unpack_counts(key),
+            }))
+        return view
+
+    def matrix_data(self, date_str: str) -> dict:
+        """
+        Данные матрицы в формате calculate_matrix, совпадают с ним полностью.
+        Для ответа бота дешевле view.
+        """
+        day = _parse(date_str)
+        if day not in self:
+            return calculate_matrix(date_str)
+
+        packed = self.packed(day)
+        first, second = unpack_first(packed), unpack_second(packed)
+        third, fourth = unpack_third(packed), unpack_fourth(packed)
+        return {
+            "first": first,
+            "second": second,
+            "third": third,
+            "fourth": fourth,
+            "full": [int(d) for d in date_str.replace(".", "") + f"{first}{second}{third}{fourth}"],
+            "counts": unpack_counts(packed),
+        }
+
+    def _build_reverse(self):
+        by_counts = {}
+        by_second = [array("I") for _ in range(16)]
+        by_fourth = [array("I") for _ in range(16)]
+        for offset, packed in enumerate(self._table):
+            key = packed & _COUNTS_MASK
+            offsets = by_counts.get(key)
+            if offsets is None:
+                offsets = by_counts[key] = array("I")
+            offsets.append(offset)
+            by_second[unpack_second(packed)].append(offset)
+            by_fourth[unpack_fourth(packed)].append(offset)
+        self._by_counts = by_counts
+        self._by_second = by_second
+        self._by_fourth = by_fourth
+
+    @staticmethod
+    def _dates(offsets) -> list:
+        return [date.fromordinal(_BASE + offset) for offset in offsets]
+
+    def dates_with_counts(self, counts) -> list:
+        if self._by_counts is None:
+            self._build_reverse()
+        return self._dates(self._by_counts.get(pack_counts(counts), ()))
+
+    def dates_with_second(self, number: int) -> list:
+        if self._by_second is None:
+            self._build_reverse()
+        return self._dates(self._by_second[number]) if 0 <= number < 16 else []
+
+    def dates_with_fourth(self, number: int) -> list:
+        if self._by_fourth is None:
+            self._build_reverse()
+        return self._dates(self._by_fourth[number]) if 0 <= number < 16 else []
+
+    def count_vectors(self) -> dict:
+        """
+        Все различные векторы счётчиков и число дат для каждого
+        """
+        if self._by_counts is None:
+            self._build_reverse()
+        return {unpack_counts(key): len(offsets) for key, offsets in self._by_counts.items()}
+
+
+def _is_stale(path: str) -> bool:
+    if not os.path.exists(path):
+        return True
+    built = os.path.getmtime(path)
+    return any(os.path.exists(source) and os.path.getmtime(source) > built for source in SOURCES)
+
+
+_index = None
+
+
+def get_index(path: str = None) -> MatrixIndex:
+    """
+    Общий индекс процесса: загружается из файла (MATRIX_INDEX_PATH),
+    а если файла нет, он старше matrix.py или не проходит проверку
+    заголовка — строится и сохраняется туда
+    """
+    global _index
+    if _index is None:
+        path = path or os.getenv("MATRIX_INDEX_PATH")
+        if path and not _is_stale(path):
+            try:
+                _index = MatrixIndex.load(path)
+            except (OSError, ValueError) as e:
+                logger.warning(f"Индекс матриц не подходит, пересобираем: {e}")
+        if _index is None:
+            _index = MatrixIndex.build()
+            if path:
+                _index.save(path)
+    return _index
+
+
+if __name__ == "__main__":
+    import sys
+
+    if len(sys.argv) != 2:
+        print("Использование: python matrix_index.py <путь к файлу индекса>")
+        sys.exit(1)
+
+    MatrixIndex.build().save(sys.argv[1])
+    print(f"Индекс сохранён: {sys.argv[1]} ({_SIZE} дат)")
@@ -0,0 +1,259 @@
+"""
+Метрики бота в текстовом формате Prometheus.
+
+Счётчики, гистограммы задержек и датчики хранятся в памяти процесса и
+отдаются локальным HTTP-эндпоинтом /metrics. RequestTimer замеряет этапы
+обработки запроса; медленные запросы (дольше SLOW_REQUEST_SECONDS)
+логируются с разбивкой по этапам с вероятностью SLOW_SAMPLE_RATE.
+"""
+import logging
+import os
+import random
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+logger = logging.getLogger(__name__)
+
+SLOW_REQUEST_SECONDS = float(os.getenv("SLOW_REQUEST_SECONDS", "1.0"))
+SLOW_SAMPLE_RATE = float(os.getenv("SLOW_SAMPLE_RATE", "1.0"))
+
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _labels(names, values) -> str:
+    if not names:
+        return ""
+    pairs = ",".join(f'{name}="{value}"' for name, value in zip(names, values))
+    return "{" + pairs + "}"
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, help: str, labels=()):
+        self.name = name
+        self.help = help
+        self.label_names = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _header(self) -> list:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+    def render(self) -> list:
+        with self._lock:
+            items = sorted(self._values.items())
+        return self._header() + [f"{self.name}{_labels(self.label_names, key)} {value}" for key, value in items]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, *labels, amount: float = 1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def value(self, *labels) -> float:
+        return self._values.get(labels, 0)
+
+
+class Gauge(_Metric):
+    """
+    Значение задаётся явно через set или вычисляется при выдаче через set_function
+    """
+    kind = "gauge"
+
+    def __init__(self, name: str, help: str, labels=()):
+        super().__init__(name, help, labels)
+        self._functions = {}
+
+    def set(self, value: float, *labels):
+        with self._lock:
+            self._values[labels] = value
+
+    def set_function(self, function, *labels):
+        with self._lock:
+            self._functions[labels] = function
+
+    def render(self) -> list:
+        with self._lock:
+            functions = list(self._functions.items())
+        for labels, function in functions:
+            try:
+                self.set(function(), *labels)
+            except Exception as e:
+                logger.debug(f"Метрика {self.name} не посчитана: {e}")
+        return super().render()
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labels=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value: float, *labels):
+        with self._lock:
+            state = self._values.get(labels)
+            if state is None:
+                state = self._values[labels] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[0][i] += 1
+            state[1] += value
+            state[2] += 1
+
+    def render(self) -> list:
+        with self._lock:
+            items = sorted((key, (list(b), s, c)) for key, (b, s, c) in self._values.items())
+        lines = self._header()
+        names = self.label_names + ("le",)
+        for key, (buckets, total, count) in items:
+            for bound, bucket_count in zip(self.buckets, buckets):
+                lines.append(f"{self.name}_bucket{_labels(names, key + (bound,))} {bucket_count}")
+            lines.append(f"{self.name}_bucket{_labels(names, key + ('+Inf',))} {count}")
+            lines.append(f"{self.name}_sum{_labels(self.label_names, key)} {total}")
+            lines.append(f"{self.name}_count{_labels(self.label_names, key)} {count}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+REQUEST_SECONDS = registry.register(Histogram(
+    "bot_request_seconds", "Полное время обработки запроса", ["handler"]))
+STAGE_SECONDS = registry.register(Histogram(
+    "bot_stage_seconds", "Время этапа обработки запроса", ["stage"]))
+ERRORS = registry.register(Counter(
+    "bot_errors_total", "Ошибки обработки по типу исключения", ["type"]))
+SEND_RETRIES = registry.register(Counter(
+    "bot_send_retries_total", "Повторы отправки в Telegram по причине", ["reason"]))
+INVALID_INPUT = registry.register(Counter(
+    "bot_invalid_input_total", "Сообщения с некорректной датой"))
+QUEUE_DEPTH = registry.register(Gauge(
+    "bot_queue_depth", "Обновлений в очереди", ["queue"]))
+CACHE_HITS = registry.register(Gauge(
+    "bot_cache_hits", "Попадания в кэш", ["cache"]))
+CACHE_MISSES = registry.register(Gauge(
+    "bot_cache_misses", "Промахи кэша", ["cache"]))
+CACHE_HIT_RATE = registry.register(Gauge(
+    "bot_cache_hit_rate", "Доля попаданий в кэш", ["cache"]))
+
+
+def track_render_caches():
+    """
+    Статистика кэшей render_cache берётся в момент выдачи метрик
+    """
+    import render_cache
+
+    for cache in render_cache.caches:
+        CACHE_HITS.set_function(lambda c=cache: c.hits, cache.name)
+        CACHE_MISSES.set_function(lambda c=cache: c.misses, cache.name)
+        CACHE_HIT_RATE.set_function(lambda c=cache: c.stats()["hit_rate"], cache.name)
+
+
+class RequestTimer:
+    """
+    Замер этапов одного запроса:
+
+        timer = RequestTimer("handle_date")
+        with timer.stage("render"):
+            ...
+        timer.finish_after(future)  # или timer.finish()
+    """
+
+    def __init__(self, handler: str):
+        self.handler = handler
+        self.stages = []
+        self._start = time.perf_counter()
+        self._deferred = False
+
+    @contextmanager
+    def stage(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            self.stages.append((name, elapsed))
+            STAGE_SECONDS.observe(elapsed, name)
+
+    def finish_after(self, future, name: str = "send"):
+        """
+        Завершает замер, когда выполнится future (отправка ответа); ожидание
+        попадает в разбивку как этап name. В STAGE_SECONDS его пишет сам
+        SendScheduler, здесь повторно не учитывается.
+        """
+        self._deferred = True
+        start = time.perf_counter()
+
+        def done(_):
+            self.stages.append((name, time.perf_counter() - start))
+            self._finish()
+
+        future.add_done_callback(done)
+
+    def finish(self) -> float:
+        # После finish_after замер завершает колбэк future
+        if self._deferred:
+            return None
+        return self._finish()
+
+    def _finish(self) -> float:
+        total = time.perf_counter() - self._start
+        REQUEST_SECONDS.observe(total, self.handler)
+        if total >= SLOW_REQUEST_SECONDS and random.random() < SLOW_SAMPLE_RATE:
+            breakdown = ", ".join(f"{name}={elapsed * 1000:.1f}мс" for name, elapsed in self.stages)
+            logger.warning(f"Медленный запрос {self.handler}: {total * 1000:.1f}мс ({breakdown})")
+        return total
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path != "/metrics":
+            self.send_response(404)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+
+        body = registry.render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_server(host: str = "127.0.0.1", port: int = 9100):
+    """
+    Эндпоинт /metrics в фоновом потоке; None, если порт занят
+    """
+    try:
+        server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    except OSError as e:
+        logger.warning(f"Эндпоинт метрик не запущен: {e}")
+        return None
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics", daemon=True).start()
+    logger.info(f"Метрики: http://{host}:{port}/metrics")
+    return server
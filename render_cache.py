@@ -0,0 +1,100 @@
+"""
+LRU-кэш готовых текстовых блоков.
+
+Тексты матрицы зависят только от вектора счётчиков цифр, задачи — только от
+second / fourth, поэтому различных блоков немного и их выгодно хранить целиком.
+"""
+import threading
+from collections import OrderedDict
+
+
+class RenderCache:
+    """
+    LRU по числу записей и суммарной длине текстов, со статистикой попаданий
+    """
+
+    def __init__(self, name: str, maxsize: int = 4096, max_chars: int = 16 * 1024 * 1024):
+        self.name = name
+        self.maxsize = maxsize
+        self.max_chars = max_chars
+        self.hits = 0
+        self.misses = 0
+        self._chars = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            text = self._data.get(key)
+            if text is None:
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return text
+
+    def put(self, key, text: str):
+        if len(text) > self.max_chars:
+            return
+        with self._lock:
+            old = self._data.pop(key, None)
+            if old is not None:
+                self._chars -= len(old)
+            self._data[key] = text
+            self._chars += len(text)
+            while len(self._data) > self.maxsize or self._chars > self.max_chars:
+                _, evicted = self._data.popitem(last=False)
+                self._chars -= len(evicted)
+
+    def get_or_render(self, key, render, *args):
+        text = self.get(key)
+        if text is None:
+            # Второй уровень — общий для процессов кэш (см. cluster.py)
+            if shared is not None:
+                text = shared.get(self.name, key)
+            if text is None:
+                text = render(*args)
+                if shared is not None:
+                    shared.put(self.name, key, text)
+            self.put(key, text)
+        return text
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._chars = 0
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "name": self.name,
+                "entries": len(self._data),
+                "chars": self._chars,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+            }
+
+
+# Все кэши процесса — для статистики и метрик
+caches = []
+
+# Общий для процессов кэш второго уровня: объект с get(name, key) / put(name, key, text)
+shared = None
+
+
+def attach_shared(backend):
+    global shared
+    shared = backend
+
+
+def register(cache: RenderCache) -> RenderCache:
+    caches.append(cache)
+    return cache
+
+
+def cache_stats() -> list:
+    return [cache.stats() for cache in caches]
@@ -0,0 +1,358 @@
+"""
+Планировщик исходящих запросов к Telegram.
+
+Все sendMessage / sendPhoto проходят через общий token bucket (глобальный
+лимит Telegram ~30 сообщений/с) и бакет каждого чата. Тексты идут раньше
+картинок, подряд стоящие тексты одному чату склеиваются в одно сообщение,
+а при 429 запрос повторяется через retry_after из ответа, и на это время
+приостанавливаются отправки во все чаты. Тексты длиннее лимита Telegram
+делятся по границам абзацев на несколько сообщений. Методы возвращают
+concurrent.futures.Future с отправленным (последним) сообщением.
+"""
+import heapq
+import itertools
+import logging
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+
+from telebot import types
+from telebot.apihelper import ApiTelegramException
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+TEXT = 0
+PHOTO = 1
+
+MAX_MESSAGE_LENGTH = 4096
+COALESCE_SEPARATOR = "\n\n"
+
+
+def utf16_length(text: str) -> int:
+    # Telegram считает длину сообщения в UTF-16: эмодзи — две единицы
+    return len(text.encode("utf-16-le")) // 2
+
+
+def _cut(text: str, limit: int) -> int:
+    """
+    Позиция разреза не длиннее limit: по абзацу, иначе по строке, иначе по символу
+    """
+    for separator in (COALESCE_SEPARATOR, "\n"):
+        end = text.rfind(separator, 0, limit)
+        while end > 0 and utf16_length(text[:end]) > limit:
+            end = text.rfind(separator, 0, end)
+        if end > 0:
+            return end
+    end = limit
+    while utf16_length(text[:end]) > limit:
+        end -= 1
+    return end
+
+
+def split_text(text: str, limit: int = MAX_MESSAGE_LENGTH) -> list:
+    """
+    Части текста не длиннее limit единиц UTF-16, по границам абзацев
+    """
+    parts = []
+    while utf16_length(text) > limit:
+        end = _cut(text, limit)
+        parts.append(text[:end])
+        text = text[end:].lstrip("\n")
+    parts.append(text)
+    return parts
+
+
+def _gather(futures: list) -> Future:
+    """
+    Future, который выполнится после всех futures: результат последнего
+    или первая ошибка
+    """
+    combined = Future()
+    remaining = [len(futures)]
+    lock = threading.Lock()
+
+    def done(future):
+        error = future.exception()
+        with lock:
+            remaining[0] -= 1
+            if combined.done():
+                return
+            if error is not None:
+                combined.set_exception(error)
+            elif remaining[0] == 0:
+                combined.set_result(futures[-1].result())
+
+    for future in futures:
+        future.add_done_callback(done)
+    return combined
+
+
+class TokenBucket:
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def delay(self, now: float) -> float:
+        """
+        Сколько ждать до появления токена (0 — токен есть)
+        """
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def take(self):
+        self.tokens -= 1
+
+
+class _Job:
+    __slots__ = ("kind", "chat_id", "payload", "kwargs", "futures", "submitted", "attempts")
+
+    def __init__(self, kind, chat_id, payload, kwargs):
+        self.kind = kind
+        self.chat_id = chat_id
+        self.payload = payload
+        self.kwargs = kwargs
+        self.futures = [Future()]
+        # Время постановки в очередь для каждого future (этап "send")
+        self.submitted = [time.perf_counter()]
+        self.attempts = 0
+
+    @property
+    def priority(self) -> int:
+        return TEXT if self.kind == "message" else PHOTO
+
+
+class _Chat:
+    __slots__ = ("jobs", "bucket", "busy", "scheduled")
+
+    def __init__(self, bucket: TokenBucket):
+        self.jobs = deque()
+        self.bucket = bucket
+        self.busy = False
+        self.scheduled = False
+
+
+class SendScheduler:
+    def __init__(self, bot, global_rate: float = 30, chat_rate: float = 1, chat_burst: float = 3,
+                 threads: int = 8, max_retries: int = 5):
+        self.bot = bot
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.max_retries = max_retries
+        self._global = TokenBucket(global_rate, global_rate)
+        # После 429 до этого момента не отправляем никому
+        self._not_before = 0.0
+        self._chats = {}
+        # Чаты, готовые к отправке: (приоритет, порядок, chat_id)
+        self._ready = []
+        # Чаты, ждущие свой лимит или retry_after: (время, порядок, chat_id)
+        self._waiting = []
+        self._seq = itertools.count()
+        self._pending = 0
+        self._closed = False
+        self._swept = time.monotonic()
+        self._cond = threading.Condition()
+        self._threads = [
+            threading.Thread(target=self._worker, name=f"sender-{i}", daemon=True) for i in range(threads)
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    # Публичный интерфейс в духе TeleBot
+
+    def send_message(self, chat_id: int, text: str, **kwargs) -> Future:
+        parts = split_text(text)
+        if len(parts) == 1:
+            return self._submit(_Job("message", chat_id, text, kwargs))
+        # Ответом на исходное сообщение оформляется только первая часть
+        rest = {k: v for k, v in kwargs.items() if k != "reply_parameters"}
+        futures = [self._submit(_Job("message", chat_id, part, kwargs if i == 0 else rest))
+                   for i, part in enumerate(parts)]
+        return _gather(futures)
+
+    def reply_to(self, message, text: str, **kwargs) -> Future:
+        return self.send_message(message.chat.id, text, reply_parameters=types.ReplyParameters(message.message_id), **kwargs)
+
+    def send_photo(self, chat_id: int, photo, **kwargs) -> Future:
+        return self._submit(_Job("photo", chat_id, photo, kwargs))
+
+    def depth(self) -> int:
+        return self._pending
+
+    def shutdown(self, timeout: float = 30):
+        """
+        Дожидается отправки всего, что уже поставлено в очередь
+        """
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        deadline = time.monotonic() + timeout
+        for thread in self._threads:
+            thread.join(max(deadline - time.monotonic(), 0))
+        if self._pending:
+            logger.warning(f"Не отправлено при остановке: {self._pending}")
+
+    # Очереди
+
+    def _submit(self, job: _Job) -> Future:
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("Планировщик отправки остановлен")
+            chat = self._chats.get(job.chat_id)
+            if chat is None:
+                chat = self._chats[job.chat_id] = _Chat(TokenBucket(self.chat_rate, self.chat_burst))
+            if job.priority == TEXT:
+                # Текст обгоняет ещё не отправленные картинки этого чата
+                position = len(chat.jobs)
+                while position and chat.jobs[position - 1].priority == PHOTO:
+                    position -= 1
+                chat.jobs.insert(position, job)
+            else:
+                chat.jobs.append(job)
+            self._pending += 1
+            self._schedule(job.chat_id, chat)
+            self._cond.notify()
+        return job.futures[0]
+
+    def _schedule(self, chat_id: int, chat: _Chat, not_before: float = 0):
+        if chat.busy or chat.scheduled or not chat.jobs:
+            return
+        chat.scheduled = True
+        if not_before > time.monotonic():
+            heapq.heappush(self._waiting, (not_before, next(self._seq), chat_id))
+        else:
+            heapq.heappush(self._ready, (chat.jobs[0].priority, next(self._seq), chat_id))
+
+    def _coalesce(self, chat: _Chat) -> _Job:
+        job = chat.jobs.popleft()
+        if job.kind != "message":
+            return job
+        kwargs = {k: v for k, v in job.kwargs.items() if k != "reply_parameters"}
+        while chat.jobs:
+            following = chat.jobs[0]
+            # У картинки payload — файл или file_id, длину не считаем
+            if following.kind != "message":
+                break
+            other = {k: v for k, v in following.kwargs.items() if k != "reply_parameters"}
+            length = utf16_length(job.payload) + len(COALESCE_SEPARATOR) + utf16_length(following.payload)
+            if other != kwargs or length > MAX_MESSAGE_LENGTH:
+                break
+            chat.jobs.popleft()
+            job.payload += COALESCE_SEPARATOR + following.payload
+            job.futures.extend(following.futures)
+            job.submitted.extend(following.submitted)
+        return job
+
+    def _take(self):
+        """
+        Следующее задание с учётом лимитов; None — планировщик остановлен и пуст
+        """
+        with self._cond:
+            while True:
+                now = time.monotonic()
+                while self._waiting and self._waiting[0][0] <= now:
+                    _, _, chat_id = heapq.heappop(self._waiting)
+                    chat = self._chats[chat_id]
+                    heapq.heappush(self._ready, (chat.jobs[0].priority, next(self._seq), chat_id))
+
+                timeout = self._waiting[0][0] - now if self._waiting else None
+                if self._ready:
+                    global_delay = max(self._not_before - now, self._global.delay(now))
+                    if global_delay:
+                        timeout = global_delay if timeout is None else min(timeout, global_delay)
+                    else:
+                        _, _, chat_id = heapq.heappop(self._ready)
+                        chat = self._chats[chat_id]
+                        chat.scheduled = False
+                        chat_delay = chat.bucket.delay(now)
+                        if chat_delay:
+                            self._schedule(chat_id, chat, now + chat_delay)
+                            continue
+                        chat.bucket.take()
+                        self._global.take()
+                        chat.busy = True
+                        return chat_id, self._coalesce(chat)
+                elif self._closed and not self._pending:
+                    return None
+
+                self._cond.wait(timeout)
+
+    def _done(self, chat_id: int, job: _Job, retry_after: float = None):
+        with self._cond:
+            chat = self._chats[chat_id]
+            chat.busy = False
+            if retry_after is not None:
+                not_before = time.monotonic() + retry_after
+                # Flood wait касается всего бота, а не только этого чата
+                self._not_before = max(self._not_before, not_before)
+                chat.jobs.appendleft(job)
+                self._schedule(chat_id, chat, not_before)
+            else:
+                self._pending -= len(job.futures)
+                self._schedule(chat_id, chat)
+            self._sweep()
+            self._cond.notify_all()
+
+    def _sweep(self):
+        # Забываем простаивающие чаты с полным бакетом, не чаще раза в минуту
+        now = time.monotonic()
+        if now - self._swept < 60:
+            return
+        self._swept = now
+        for chat_id, chat in list(self._chats.items()):
+            if not (chat.jobs or chat.busy or chat.scheduled) and chat.bucket.delay(now) == 0 \
+                    and chat.bucket.tokens >= chat.bucket.capacity:
+                del self._chats[chat_id]
+
+    def _send(self, job: _Job):
+        if job.kind == "message":
+            return self.bot.send_message(job.chat_id, job.payload, **job.kwargs)
+        if hasattr(job.payload, "seek"):
+            # Повторная попытка должна читать файл с начала
+            job.payload.seek(0)
+        return self.bot.send_photo(job.chat_id, job.payload, **job.kwargs)
+
+    def _worker(self):
+        while True:
+            taken = self._take()
+            if taken is None:
+                return
+            chat_id, job = taken
+            job.attempts += 1
+            try:
+                result = self._send(job)
+            except ApiTelegramException as e:
+                if e.error_code == 429 and job.attempts <= self.max_retries:
+                    retry_after = (e.result_json or {}).get("parameters", {}).get("retry_after", 1)
+                    metrics.SEND_RETRIES.inc("429")
+                    logger.warning(f"429 для чата {chat_id}, повтор через {retry_after}с")
+                    self._done(chat_id, job, retry_after=retry_after)
+                    continue
+                self._fail(chat_id, job, e)
+            except Exception as e:
+                self._fail(chat_id, job, e)
+            else:
+                self._done(chat_id, job)
+                self._observe(job)
+                for future in job.futures:
+                    future.set_result(result)
+
+    @staticmethod
+    def _observe(job: _Job):
+        # От постановки в очередь до ответа Telegram, включая ожидание лимитов и повторы
+        now = time.perf_counter()
+        for submitted in job.submitted:
+            metrics.STAGE_SECONDS.observe(now - submitted, "send")
+
+    def _fail(self, chat_id: int, job: _Job, error: Exception):
+        metrics.ERRORS.inc(type(error).__name__)
+        logger.error(f"Не удалось отправить {job.kind} в чат {chat_id}: {error}")
+        self._done(chat_id, job)
+        self._observe(job)
+        for future in job.futures:
+            future.set_exception(error)
@@ -0,0 +1,184 @@
+"""
+Хранилище подписчиков ежедневного гороскопа (SQLite).
+
+Для каждого чата хранятся дата рождения, часовой пояс и уже посчитанные
+second / fourth, чтобы рассылке не нужно было пересчитывать матрицу.
+Рассылка идёт в два шага. Выборка пачки ставит на подписчиков аренду
+(claimed_until), и параллельные шарды и повторные запуски их не берут.
+После успешной отправки записывается last_sent, после ошибки аренда
+снимается и считается неудачная попытка за день (failed_day / failures):
+после max_attempts подписчик до следующего дня не выбирается. Если процесс
+упал, аренда истекает сама, и подписчик получит рассылку при следующем
+запуске: никто не теряется, а повторно сообщение может прийти лишь тем, кому
+оно ушло в момент падения.
+"""
+import os
+import sqlite3
+import threading
+import time
+
+DEFAULT_PATH = os.getenv("SUBSCRIBERS_DB", "subscribers.db")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS subscribers (
+    chat_id   INTEGER PRIMARY KEY,
+    birthdate TEXT    NOT NULL,
+    timezone  TEXT    NOT NULL,
+    second    INTEGER NOT NULL,
+    fourth    INTEGER NOT NULL,
+    last_sent TEXT,
+    claimed_until REAL,
+    failed_day TEXT,
+    failures  INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS subscribers_timezone ON subscribers (timezone, chat_id);
+-- Для has_pending: пояс, где рассылка за день закончена, проверяется без обхода строк
+CREATE INDEX IF NOT EXISTS subscribers_pending ON subscribers (timezone, last_sent);
+"""
+
+# Колонки, добавленные после первой версии схемы
+_MIGRATIONS = {
+    "claimed_until": "ALTER TABLE subscribers ADD COLUMN claimed_until REAL",
+    "failed_day": "ALTER TABLE subscribers ADD COLUMN failed_day TEXT",
+    "failures": "ALTER TABLE subscribers ADD COLUMN failures INTEGER NOT NULL DEFAULT 0",
+}
+
+# Условие «подписчик ещё ждёт рассылку за day»: параметры day, day, max_attempts
+_PENDING = """
+    (last_sent IS NULL OR last_sent < ?)
+    AND (failed_day IS NULL OR failed_day != ? OR failures < ?)
+"""
+
+
+class SubscriberStore:
+    def __init__(self, path: str = DEFAULT_PATH):
+        self.path = path
+        self._local = threading.local()
+        connection = self._connection()
+        columns = {row["name"] for row in connection.execute("PRAGMA table_info(subscribers)")}
+        if columns:
+            for column, sql in _MIGRATIONS.items():
+                if column not in columns:
+                    connection.execute(sql)
+        connection.executescript(_SCHEMA)
+
+    def _connection(self) -> sqlite3.Connection:
+        # Соединение на поток: sqlite3 не разрешает делить его между потоками
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.row_factory = sqlite3.Row
+            self._local.connection = connection
+        return connection
+
+    def subscribe(self, chat_id: int, birthdate: str, timezone: str, second: int, fourth: int):
+        self._connection().execute(
+            """
+            INSERT INTO subscribers (chat_id, birthdate, timezone, second, fourth)
+            VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT (chat_id) DO UPDATE SET
+                birthdate = excluded.birthdate,
+                timezone = excluded.timezone,
+                second = excluded.second,
+                fourth = excluded.fourth
+            """,
+            (chat_id, birthdate, timezone, second, fourth),
+        )
+
+    def unsubscribe(self, chat_id: int) -> bool:
+        cursor = self._connection().execute("DELETE FROM subscribers WHERE chat_id = ?", (chat_id,))
+        return cursor.rowcount > 0
+
+    def get(self, chat_id: int):
+        return self._connection().execute(
+            "SELECT * FROM subscribers WHERE chat_id = ?", (chat_id,)).fetchone()
+
+    def count(self) -> int:
+        return self._connection().execute("SELECT COUNT(*) FROM subscribers").fetchone()[0]
+
+    def timezones(self) -> list:
+        rows = self._connection().execute("SELECT DISTINCT timezone FROM subscribers")
+        return [row[0] for row in rows]
+
+    def has_pending(self, timezone: str, day: str, max_attempts: int = 3) -> bool:
+        """
+        Есть ли в поясе подписчики, ждущие рассылку за day. По индексу
+        subscribers_pending обходятся только строки без last_sent за day
+        """
+        # OR по last_sent SQLite не сводит к диапазону индекса — две проверки
+        retry = "(failed_day IS NULL OR failed_day != ? OR failures < ?)"
+        row = self._connection().execute(
+            f"""
+            SELECT EXISTS (SELECT 1 FROM subscribers WHERE timezone = ? AND last_sent IS NULL AND {retry})
+                OR EXISTS (SELECT 1 FROM subscribers WHERE timezone = ? AND last_sent < ? AND {retry})
+            """,
+            (timezone, day, max_attempts, timezone, day, day, max_attempts),
+        ).fetchone()
+        return bool(row[0])
+
+    def claim_batch(self, timezone: str, day: str, after_chat_id: int, limit: int,
+                    shard: int = 0, shards: int = 1, lease: float = 600, max_attempts: int = 3) -> list:
+        """
+        Выбирает следующую пачку подписчиков пояса, ещё не получивших рассылку
+        за day и не исчерпавших max_attempts попыток, и берёт их в аренду на
+        lease секунд. Возвращает (chat_id, second, fourth)
+        """
+        now = time.time()
+        connection = self._connection()
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            rows = connection.execute(
+                f"""
+                SELECT chat_id, second, fourth FROM subscribers
+                WHERE timezone = ? AND chat_id > ? AND {_PENDING}
+                  AND (claimed_until IS NULL OR claimed_until < ?)
+                  AND ((chat_id % ?) + ?) % ? = ?
+                ORDER BY chat_id
+                LIMIT ?
+                """,
+                (timezone, after_chat_id, day, day, max_attempts, now, shards, shards, shards, shard, limit),
+            ).fetchall()
+            connection.executemany(
+                "UPDATE subscribers SET claimed_until = ? WHERE chat_id = ?",
+                [(now + lease, row["chat_id"]) for row in rows],
+            )
+            connection.execute("COMMIT")
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
+        return [(row["chat_id"], row["second"], row["fourth"]) for row in rows]
+
+    def _executemany(self, sql: str, rows: list):
+        # Одна транзакция на пачку, а не на строку
+        if not rows:
+            return
+        connection = self._connection()
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            connection.executemany(sql, rows)
+            connection.execute("COMMIT")
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
+
+    def mark_sent(self, chat_ids: list, day: str):
+        self._executemany(
+            "UPDATE subscribers SET last_sent = ?, claimed_until = NULL WHERE chat_id = ?",
+            [(day, chat_id) for chat_id in chat_ids],
+        )
+
+    def release(self, chat_ids: list, day: str):
+        """
+        Снимает аренду после неудачной попытки за day: подписчик попадёт в
+        следующий запуск рассылки, пока не исчерпает попытки
+        """
+        self._executemany(
+            """
+            UPDATE subscribers SET claimed_until = NULL,
+                failures = CASE WHEN failed_day = ? THEN failures + 1 ELSE 1 END,
+                failed_day = ?
+            WHERE chat_id = ?
+            """,
+            [(day, day, chat_id) for chat_id in chat_ids],
+        )
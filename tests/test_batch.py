@@ -0,0 +1,38 @@
+import csv
+import io
+import json
+
+from batch import INVALID_DATE, run
+from matrix import calculate_matrix
+
+INPUT = "user_id,birthdate\n7,15.05.1990\n8,1.5.1990\n9,31.02.1990\n10,15.05.19901\n11,\n12,29.02.2000\n"
+
+
+def _run(fmt="csv", **kwargs) -> tuple:
+    out = io.StringIO()
+    total, invalid = run(io.StringIO(INPUT), out, column="birthdate", id_column="user_id", fmt=fmt,
+                         chunk_size=2, **kwargs)
+    return out.getvalue(), total, invalid
+
+
+def test_invalid_rows_are_kept_with_error_flag():
+    text, total, invalid = _run()
+    rows = list(csv.DictReader(io.StringIO(text)))
+    assert (total, invalid) == (6, 3)
+    assert [row["row"] for row in rows] == ["1", "2", "3", "4", "5", "6"]
+    assert [row["user_id"] for row in rows] == ["7", "8", "9", "10", "11", "12"]
+    assert [row["error"] for row in rows] == ["", "", INVALID_DATE, INVALID_DATE, INVALID_DATE, ""]
+    assert rows[2]["first"] == ""
+
+
+def test_matches_calculate_matrix_and_pads_short_dates():
+    text, _, _ = _run(fmt="jsonl", jobs=2)
+    records = [json.loads(line) for line in text.splitlines()]
+    valid = [record for record in records if "error" not in record]
+    assert [record["date"] for record in valid] == ["15.05.1990", "01.05.1990", "29.02.2000"]
+    for record in valid:
+        expected = calculate_matrix(record["date"])
+        assert record["counts"] == list(expected["counts"])
+        assert [record[key] for key in ("first", "second", "third", "fourth")] == \
+            [expected[key] for key in ("first", "second", "third", "fourth")]
+    assert records[3] == {"row": 4, "id": "10", "date": "15.05.19901", "error": INVALID_DATE}
@@ -0,0 +1,123 @@
+from concurrent.futures import Future
+from datetime import date, datetime
+
+import pytz
+from telebot.apihelper import ApiTelegramException
+
+from broadcast import BroadcastScheduler
+from subscribers import SubscriberStore
+
+TIMEZONE = "Europe/Moscow"
+DAY = date(2026, 10, 18)
+
+
+class _Tables:
+    def table_for(self, day):
+        return {(second, fourth): f"{day} {second}/{fourth}" for second in range(1, 10) for fourth in range(1, 10)}
+
+
+class _Sender:
+    def __init__(self, errors: dict = None):
+        self.errors = errors or {}
+        self.sent = []
+
+    def send_message(self, chat_id, text):
+        future = Future()
+        error = self.errors.get(chat_id)
+        if error is None:
+            self.sent.append(chat_id)
+            future.set_result(True)
+        else:
+            future.set_exception(error)
+        return future
+
+
+def _api_error(code: int) -> ApiTelegramException:
+    return ApiTelegramException("sendMessage", None, {"error_code": code, "description": "error"})
+
+
+def _store(tmp_path, count: int = 20) -> SubscriberStore:
+    store = SubscriberStore(str(tmp_path / "subscribers.db"))
+    for chat_id in range(count):
+        store.subscribe(chat_id, "15.05.1990", TIMEZONE, 3, 6)
+    return store
+
+
+def test_failed_sends_are_retried_and_blocked_chats_removed(tmp_path):
+    store = _store(tmp_path)
+    sender = _Sender({3: _api_error(403), 5: _api_error(500), 8: ConnectionError("reset")})
+    scheduler = BroadcastScheduler(store, sender, _Tables(), hour=9, batch_size=4, shards=2)
+    now = datetime(2026, 10, 18, 9, 30, tzinfo=pytz.utc)
+
+    assert scheduler.run_once(now) == 17
+    assert store.get(3) is None
+    assert store.get(5)["last_sent"] is None
+
+    # Сбой прошёл — следующий запуск досылает только пропущенным
+    sender.errors = {}
+    assert scheduler.run_once(now) == 2
+    assert sorted(sender.sent) == [chat_id for chat_id in range(20) if chat_id != 3]
+
+
+def test_permanent_errors_unsubscribe_and_retries_are_capped(tmp_path):
+    store = _store(tmp_path, count=4)
+    sender = _Sender({1: _api_error(400), 2: _api_error(500)})
+    scheduler = BroadcastScheduler(store, sender, _Tables(), hour=9, batch_size=4, shards=1, max_attempts=3)
+    now = datetime(2026, 10, 18, 9, 30, tzinfo=pytz.utc)
+
+    assert scheduler.run_once(now) == 2
+    # 400 chat not found — как 403, подписка снята
+    assert store.get(1) is None
+    for _ in range(5):
+        scheduler.run_once(now)
+    assert store.get(2)["failures"] == 3
+    assert not store.has_pending(TIMEZONE, DAY.isoformat())
+
+    # На следующий день попытки начинаются заново
+    sender.errors = {}
+    assert scheduler.run_once(datetime(2026, 10, 19, 9, 30, tzinfo=pytz.utc)) == 3
+
+
+def test_finished_timezone_is_not_scanned(tmp_path):
+    store = _store(tmp_path, count=3)
+    scheduler = BroadcastScheduler(store, _Sender(), _Tables(), hour=9, shards=2)
+    now = datetime(2026, 10, 18, 9, 30, tzinfo=pytz.utc)
+    assert scheduler.run_once(now) == 3
+
+    def fail(*args, **kwargs):
+        raise AssertionError("пояс уже разослан")
+
+    store.claim_batch = fail
+    assert scheduler.run_once(now) == 0
+    store.subscribe(10, "15.05.1990", TIMEZONE, 3, 6)
+    assert store.has_pending(TIMEZONE, DAY.isoformat())
+
+
+def test_old_database_is_migrated(tmp_path):
+    import sqlite3
+
+    path = str(tmp_path / "old.db")
+    connection = sqlite3.connect(path)
+    connection.execute(
+        "CREATE TABLE subscribers (chat_id INTEGER PRIMARY KEY, birthdate TEXT NOT NULL, timezone TEXT NOT NULL,"
+        " second INTEGER NOT NULL, fourth INTEGER NOT NULL, last_sent TEXT)")
+    connection.execute("INSERT INTO subscribers VALUES (1, '15.05.1990', 'Europe/Moscow', 3, 6, NULL)")
+    connection.commit()
+    connection.close()
+    store = SubscriberStore(path)
+    assert store.claim_batch(TIMEZONE, DAY.isoformat(), -1, 10) == [(1, 3, 6)]
+
+
+def test_claimed_rows_come_back_after_lease_expires(tmp_path):
+    store = _store(tmp_path, count=3)
+    # Процесс «упал» после выборки, ничего не отправив
+    assert len(store.claim_batch(TIMEZONE, DAY.isoformat(), -1, 10)) == 3
+    assert store.claim_batch(TIMEZONE, DAY.isoformat(), -1, 10) == []
+    store._connection().execute("UPDATE subscribers SET claimed_until = 0")
+    assert len(store.claim_batch(TIMEZONE, DAY.isoformat(), -1, 10)) == 3
+
+
+def test_sent_rows_are_not_claimed_again(tmp_path):
+    store = _store(tmp_path, count=3)
+    store.mark_sent([0, 1, 2], DAY.isoformat())
+    assert store.claim_batch(TIMEZONE, DAY.isoformat(), -1, 10) == []
@@ -0,0 +1,56 @@
+import pytest
+
+from catalog import TextCatalog, build, collect_texts
+
+TEXTS = {
+    "matrix/1": "один",
+    "matrix/11": "два",
+    "matrix/111": "три 🔮",
+    "matrix_values/1/female": "она",
+    "tasks/1": "задача",
+    "ёлка/1": "не ASCII",
+}
+
+
+@pytest.fixture
+def catalog(tmp_path):
+    path = str(tmp_path / "texts.cat")
+    build(path, TEXTS)
+    return TextCatalog(path)
+
+
+def test_lookups(catalog):
+    assert len(catalog) == len(TEXTS)
+    for key, text in TEXTS.items():
+        assert key in catalog
+        assert catalog.get(key) == text
+    assert catalog.get("matrix/2") is None
+    assert catalog.get("matrix/1111", "нет") == "нет"
+    assert "zzz" not in catalog and "" not in catalog
+
+
+def test_sections(catalog):
+    matrix = catalog.section("matrix")
+    # Префикс "matrix/" не захватывает раздел "matrix_values"
+    assert dict(matrix) == {"1": "один", "11": "два", "111": "три 🔮"}
+    assert matrix["111"] == "три 🔮"
+    with pytest.raises(KeyError):
+        matrix["2"]
+    assert catalog.section("ёлка")["1"] == "не ASCII"
+    assert len(catalog.section("missing")) == 0
+
+
+def test_roundtrip_of_bot_texts(tmp_path):
+    texts = collect_texts()
+    path = str(tmp_path / "texts.cat")
+    build(path, texts)
+    catalog = TextCatalog(path)
+    assert sorted(catalog.keys()) == sorted(texts)
+    assert all(catalog.get(key) == text for key, text in texts.items())
+
+
+def test_rejects_other_files(tmp_path):
+    path = tmp_path / "other.cat"
+    path.write_bytes(b"NOPE" + bytes(16))
+    with pytest.raises(ValueError):
+        TextCatalog(str(path))
@@ -0,0 +1,42 @@
+import threading
+import time
+
+from cluster import _liveness
+
+
+class _Value:
+    value = 0.0
+
+
+class _Dispatcher:
+    processed = 0
+
+
+class _Bot:
+    def __init__(self):
+        self.dispatcher = _Dispatcher()
+
+
+def _run_liveness(state, bot) -> _Value:
+    heartbeat = _Value()
+    threading.Thread(target=_liveness, args=(heartbeat, state, bot), daemon=True).start()
+    return heartbeat
+
+
+def test_blocked_loop_with_progress_is_alive():
+    # Цикл стоит на заполненных очередях, но потоки обработчиков продвигаются
+    bot = _Bot()
+    heartbeat = _run_liveness({"idle": False, "turns": 0}, bot)
+    time.sleep(1.2)
+    first = heartbeat.value
+    bot.dispatcher.processed += 1
+    time.sleep(1.2)
+    assert heartbeat.value > first
+
+
+def test_stuck_worker_stops_heartbeat():
+    heartbeat = _run_liveness({"idle": False, "turns": 0}, _Bot())
+    time.sleep(1.2)
+    first = heartbeat.value
+    time.sleep(2.2)
+    assert heartbeat.value == first
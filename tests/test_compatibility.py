@@ -0,0 +1,37 @@
+import numpy as np
+
+from compatibility import GroupCache, build_compatibility_text, group_scores, score_matrix
+from matrix import calculate_matrix
+
+DATES = ["15.05.1990", "01.01.2000", "29.02.1988", "07.11.1975", "31.12.1999"]
+
+
+def test_group_scores_follow_triu_order_and_hit_cache():
+    dates, scores = group_scores(DATES, calculate_matrix)
+    assert dates == tuple(sorted(DATES))
+    data = [calculate_matrix(d) for d in dates]
+    matrix = score_matrix([d["counts"] for d in data], [d["second"] for d in data], [d["fourth"] for d in data])
+    rows, cols = np.triu_indices(len(dates), k=1)
+    assert scores.tolist() == matrix[rows, cols].tolist()
+
+    def fail(date_str):
+        raise AssertionError("повторный запрос должен идти из кэша")
+
+    cached_dates, cached = group_scores(list(reversed(DATES)), fail)
+    assert cached_dates == dates and cached is scores
+
+
+def test_report_lists_pairs_with_their_scores():
+    dates, scores = group_scores(DATES, calculate_matrix)
+    text = build_compatibility_text(DATES, calculate_matrix)
+    rows, cols = np.triu_indices(len(dates), k=1)
+    for i, j, score in zip(rows.tolist(), cols.tolist(), scores.tolist()):
+        assert f"{dates[i]} × {dates[j]}: {score}%" in text
+
+
+def test_group_cache_bounds_total_pairs():
+    cache = GroupCache("test", max_pairs=10)
+    cache.put(("a",), np.zeros(6, dtype=np.int16))
+    cache.put(("b",), np.zeros(6, dtype=np.int16))
+    assert cache.get(("a",)) is None
+    assert cache.stats()["pairs"] == 6
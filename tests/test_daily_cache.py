@@ -0,0 +1,84 @@
+import time
+from datetime import date, datetime, timedelta
+
+import pytz
+
+from daily_cache import DailyHoroscopeCache
+
+
+class _Build:
+    def __init__(self):
+        self.days = []
+
+    def __call__(self, matrix_data, day):
+        self.days.append(day.date())
+        return f"{day:%d.%m.%Y} {matrix_data['second']}/{matrix_data['fourth']}"
+
+
+def _cache(timezone: str, **kwargs) -> tuple:
+    build = _Build()
+    return DailyHoroscopeCache(build, timezone=timezone, **kwargs), build
+
+
+def _local(timezone: str, *args) -> datetime:
+    return pytz.timezone(timezone).localize(datetime(*args))
+
+
+def _clock(timezone: str, start: datetime):
+    # Часы, идущие с реальной скоростью от start
+    zone, began = pytz.timezone(timezone), time.monotonic()
+    return lambda: zone.normalize(start + timedelta(seconds=time.monotonic() - began))
+
+
+def test_rollover_switches_to_prewarmed_table():
+    cache, build = _cache("Europe/Berlin")
+    before = _local("Europe/Berlin", 2026, 10, 24, 23, 56)
+    assert cache.table(before)[0] == date(2026, 10, 24)
+
+    cache.prewarm_next(before)
+    prewarmed = cache._next
+    assert prewarmed[0] == date(2026, 10, 25)
+    # До полуночи запросы видят старый день целиком
+    assert cache.table(_local("Europe/Berlin", 2026, 10, 24, 23, 59, 59))[0] == date(2026, 10, 24)
+
+    rendered = len(build.days)
+    after = cache.table(_local("Europe/Berlin", 2026, 10, 25, 0, 0, 1))
+    assert after is prewarmed
+    assert len(build.days) == rendered
+    assert after[1][(3, 6)] == "25.10.2026 3/6"
+
+
+def test_rollover_without_prewarm_renders_once():
+    cache, build = _cache("Europe/Moscow")
+    cache.table(_local("Europe/Moscow", 2026, 10, 18, 23, 59))
+    first = cache.table(_local("Europe/Moscow", 2026, 10, 19, 0, 0, 1))
+    second = cache.table(_local("Europe/Moscow", 2026, 10, 19, 0, 1))
+    assert first is second and first[0] == date(2026, 10, 19)
+    assert len(build.days) == 2 * 81
+
+
+def test_seconds_until_midnight_on_dst_days():
+    cache, _ = _cache("Europe/Berlin")
+    # 29.03.2026 — 23 часа, 25.10.2026 — 25 часов
+    assert cache.seconds_until_midnight(_local("Europe/Berlin", 2026, 3, 29, 0, 30)) == 22.5 * 3600
+    assert cache.seconds_until_midnight(_local("Europe/Berlin", 2026, 10, 25, 0, 30)) == 24.5 * 3600
+
+
+def test_prewarm_loop_across_midnight_dst_switch():
+    # В Гаване 08.03.2026 часы переводятся в полночь: 00:00 → 01:00
+    timezone = "America/Havana"
+    cache, build = _cache(timezone, prewarm_seconds=300)
+    cache.now = _clock(timezone, _local(timezone, 2026, 3, 7, 23, 59, 59, 500000))
+    cache.start_prewarm()
+    try:
+        deadline = time.monotonic() + 5
+        while cache._table[0] != date(2026, 3, 8) and time.monotonic() < deadline:
+            time.sleep(0.02)
+    finally:
+        cache.stop()
+    assert cache._table[0] == date(2026, 3, 8)
+    assert cache._table is cache._next
+    # Только текущий день при старте и заранее подготовленный следующий
+    assert len(build.days) == 2 * 81
+    assert sorted(set(build.days)) == [date(2026, 3, 7), date(2026, 3, 8)]
+
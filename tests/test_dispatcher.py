@@ -0,0 +1,19 @@
+from dispatcher import ChatDispatcher
+
+
+def test_shutdown_without_start():
+    # Диспетчер процесса-диспетчера кластера так и не запускается
+    dispatcher = ChatDispatcher(lambda item: None, workers=2)
+    dispatcher.shutdown(timeout=1)
+
+
+def test_processes_in_order_per_key():
+    handled = []
+    dispatcher = ChatDispatcher(handled.append, workers=3).start()
+    for i in range(100):
+        dispatcher.submit(i % 5, (i % 5, i))
+    dispatcher.shutdown()
+    assert dispatcher.processed == 100
+    for key in range(5):
+        items = [i for k, i in handled if k == key]
+        assert items == sorted(items)
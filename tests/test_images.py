@@ -0,0 +1,86 @@
+from concurrent.futures import Future
+from types import SimpleNamespace
+
+from telebot.apihelper import ApiTelegramException
+
+from images import ImageDelivery
+
+
+class _Scheduler:
+    """
+    Как SendScheduler: send_photo сразу возвращает Future
+    """
+
+    def __init__(self):
+        self.by_file_id = []
+        self.uploads = 0
+
+    def send_photo(self, chat_id, photo, caption=None, **kwargs):
+        future = Future()
+        if isinstance(photo, str):
+            self.by_file_id.append(future)
+        else:
+            self.uploads += 1
+            future.set_result(SimpleNamespace(photo=[SimpleNamespace(file_id="fresh")]))
+        return future
+
+
+def _delivery(tmp_path, file_id=None) -> ImageDelivery:
+    delivery = ImageDelivery(url="http://127.0.0.1:9/none.png", cache_dir=str(tmp_path))
+    delivery._image = b"\x89PNG"
+    delivery._file_id = file_id
+    return delivery
+
+
+def test_send_by_file_id_does_not_block(tmp_path):
+    bot = _Scheduler()
+    delivery = _delivery(tmp_path, "cached")
+    futures = [delivery.send_async(bot, chat_id) for chat_id in range(500)]
+    # Ни одна отправка не завершена, но вызовы вернулись и пул загрузок не занят
+    assert len(bot.by_file_id) == 500
+    assert not any(future.done() for future in futures)
+    assert bot.uploads == 0
+    delivery.shutdown()
+
+
+def test_stale_file_id_triggers_upload(tmp_path):
+    bot = _Scheduler()
+    delivery = _delivery(tmp_path, "stale")
+    delivery.send_async(bot, 1)
+    bot.by_file_id[0].set_exception(
+        ApiTelegramException("sendPhoto", None, {"error_code": 400, "description": "Bad Request: wrong file identifier"})
+    )
+    delivery.shutdown()
+    assert bot.uploads == 1
+    assert delivery._file_id == "fresh"
+
+
+def test_chat_error_keeps_file_id(tmp_path):
+    bot = _Scheduler()
+    delivery = _delivery(tmp_path, "cached")
+    delivery.send_async(bot, 1)
+    bot.by_file_id[0].set_exception(
+        ApiTelegramException("sendPhoto", None, {"error_code": 400, "description": "Bad Request: chat not found"})
+    )
+    delivery.shutdown()
+    assert bot.uploads == 0
+    assert delivery._file_id == "cached"
+
+
+def test_upload_queue_is_bounded(tmp_path):
+    delivery = ImageDelivery(url="http://127.0.0.1:9/none.png", cache_dir=str(tmp_path), max_pending=2)
+    delivery._image = b"\x89PNG"
+
+    class _Blocking:
+        def __init__(self):
+            self.release = Future()
+
+        def send_photo(self, chat_id, photo, caption=None, **kwargs):
+            self.release.result(timeout=5)
+            return SimpleNamespace(photo=[SimpleNamespace(file_id="fresh")])
+
+    bot = _Blocking()
+    accepted = [delivery.send_async(bot, chat_id) for chat_id in range(10)]
+    assert sum(future is not None for future in accepted) == 2
+    bot.release.set_result(None)
+    delivery.shutdown()
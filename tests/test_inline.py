@@ -0,0 +1,68 @@
+from datetime import datetime
+
+import pytest
+
+from inline import (FORMAT_ERROR_TEXT, HINT_TEXT, HINTS, NO_SUCH_DATE_TEXT, PARTIAL_RE, TRUNCATED_TEXT,
+                    InlineAnswers, _fit)
+from matrix import calculate_matrix
+from sender import MAX_MESSAGE_LENGTH, utf16_length
+
+
+class _DailyCache:
+    def now(self) -> datetime:
+        return datetime(2026, 10, 18, 12, 0)
+
+    def seconds_until_midnight(self) -> float:
+        return 99.5
+
+    def get(self, matrix_data) -> str:
+        return f"Гороскоп {matrix_data['second']}"
+
+
+@pytest.mark.parametrize("query", ["", "1", "15", "15.", "15.0", "15.05", "15.05.", "15.05.1", "15.05.199"])
+def test_partial_input_matches(query):
+    assert PARTIAL_RE.fullmatch(query)
+
+
+@pytest.mark.parametrize("query", ["abc", "1.5", "155", "15.5.", "15/05", "15.05.19901", "15.05.1990 x"])
+def test_other_input_does_not_match(query):
+    assert not PARTIAL_RE.fullmatch(query)
+
+
+@pytest.mark.parametrize("query, hint", [
+    ("", HINT_TEXT),
+    (" 15.05 ", HINT_TEXT),
+    ("15.5.1990", FORMAT_ERROR_TEXT),
+    ("завтра", FORMAT_ERROR_TEXT),
+    ("31.02.1990", NO_SUCH_DATE_TEXT),
+])
+def test_hints(query, hint):
+    answers = InlineAnswers(calculate_matrix, _DailyCache())
+    assert answers.answer(query) is HINTS[hint]
+
+
+def test_full_date_is_rendered_once():
+    answers = InlineAnswers(calculate_matrix, _DailyCache())
+    first = answers.answer("15.05.1990")
+    assert [result.id for result in first["results"]] == ["horoscope", "tasks", "matrix"]
+    assert first["results"][0].input_message_content.message_text == "Гороскоп 3"
+    assert first["cache_time"] == 100 and first["is_personal"] is False
+
+    second = answers.answer("15.05.1990")
+    assert second["results"] is first["results"]
+    assert (answers.hits, answers.misses) == (1, 1)
+
+
+def test_fit_keeps_short_text():
+    assert _fit("коротко") == "коротко"
+
+
+def test_fit_truncates_at_paragraph():
+    paragraphs = [f"Абзац {i} " + "🔮" * 200 for i in range(30)]
+    text = "\n\n".join(paragraphs)
+    fitted = _fit(text)
+    assert utf16_length(fitted) <= MAX_MESSAGE_LENGTH
+    assert fitted.endswith(TRUNCATED_TEXT)
+    body = fitted[:-len(TRUNCATED_TEXT)]
+    # Обрезано по целым абзацам
+    assert text.startswith(body) and text[len(body):].startswith("\n\n")
@@ -0,0 +1,82 @@
+import os
+import struct
+from datetime import date, timedelta
+
+import pytest
+
+import matrix_index
+from matrix import calculate_matrix
+from matrix_index import FIRST_DATE, LAST_DATE, MatrixIndex
+
+
+@pytest.fixture(scope="module")
+def index():
+    return MatrixIndex.build()
+
+
+def _sample():
+    day = FIRST_DATE
+    while day <= LAST_DATE:
+        yield day.strftime("%d.%m.%Y")
+        day += timedelta(days=113)
+
+
+def test_matrix_data_matches_calculate_matrix(index):
+    for date_str in list(_sample()) + ["1.5.1990", "31.12.2150"]:
+        assert index.matrix_data(date_str) == calculate_matrix(date_str)
+
+
+def test_view_is_shared_and_read_only(index):
+    first, second = index.view("01.05.1990"), index.view("1.5.1990")
+    assert first is second
+    expected = calculate_matrix("01.05.1990")
+    assert dict(first) == {key: expected[key] for key in ("second", "fourth", "counts")}
+    with pytest.raises(TypeError):
+        first["second"] = 0
+
+
+def test_save_load_roundtrip(index, tmp_path):
+    path = str(tmp_path / "index.bin")
+    index.save(path)
+    loaded = MatrixIndex.load(path)
+    assert loaded.packed(date(1990, 5, 1)) == index.packed(date(1990, 5, 1))
+    assert loaded.packed(LAST_DATE) == index.packed(LAST_DATE)
+
+
+def test_mismatched_files_are_rejected(index, tmp_path):
+    path = str(tmp_path / "index.bin")
+    index.save(path)
+    with open(path, "rb") as f:
+        data = f.read()
+
+    # Старый формат без заголовка
+    with open(path, "wb") as f:
+        f.write(data[matrix_index._HEADER.size:])
+    with pytest.raises(ValueError):
+        MatrixIndex.load(path)
+
+    # Другая версия calculate_matrix — другой отпечаток
+    magic, version, base, size, crc = matrix_index._HEADER.unpack_from(data)
+    with open(path, "wb") as f:
+        f.write(matrix_index._HEADER.pack(magic, version, base, size, crc ^ 1) + data[matrix_index._HEADER.size:])
+    with pytest.raises(ValueError, match="calculate_matrix"):
+        MatrixIndex.load(path)
+
+    with open(path, "wb") as f:
+        f.write(data[:-8])
+    with pytest.raises(ValueError):
+        MatrixIndex.load(path)
+
+
+def test_get_index_rebuilds_bad_file(index, tmp_path, monkeypatch):
+    path = str(tmp_path / "index.bin")
+    with open(path, "wb") as f:
+        f.write(struct.pack("<Q", 0) * len(index))
+    monkeypatch.setattr(matrix_index, "_index", None)
+    monkeypatch.setattr(matrix_index.MatrixIndex, "build", classmethod(lambda cls: index))
+    assert matrix_index.get_index(path) is index
+    assert MatrixIndex.load(path).packed(FIRST_DATE) == index.packed(FIRST_DATE)
+
+    # Файл старше matrix.py тоже пересобирается
+    os.utime(path, (0, 0))
+    assert matrix_index._is_stale(path)
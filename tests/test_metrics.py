@@ -0,0 +1,88 @@
+import urllib.error
+import urllib.request
+from concurrent.futures import Future
+
+import metrics
+from metrics import RequestTimer
+
+
+def _count(histogram, *labels) -> int:
+    state = histogram._values.get(labels)
+    return state[2] if state else 0
+
+
+def test_finish_after_waits_for_delivery():
+    before = _count(metrics.REQUEST_SECONDS, "test_deferred")
+    timer = RequestTimer("test_deferred")
+    future = Future()
+    timer.finish_after(future)
+    # finally обработчика: замер ещё не завершён
+    assert timer.finish() is None
+    assert _count(metrics.REQUEST_SECONDS, "test_deferred") == before
+
+    future.set_result(None)
+    assert _count(metrics.REQUEST_SECONDS, "test_deferred") == before + 1
+    assert [name for name, _ in timer.stages] == ["send"]
+    timer.finish()
+    assert _count(metrics.REQUEST_SECONDS, "test_deferred") == before + 1
+
+
+def test_histogram_renders_cumulative_buckets():
+    histogram = metrics.Histogram("test_seconds", "Тест", ["stage"], buckets=(0.1, 1.0))
+    for value in (0.05, 0.5, 0.5, 5.0):
+        histogram.observe(value, "render")
+    assert histogram.render() == [
+        "# HELP test_seconds Тест",
+        "# TYPE test_seconds histogram",
+        'test_seconds_bucket{stage="render",le="0.1"} 1',
+        'test_seconds_bucket{stage="render",le="1.0"} 3',
+        'test_seconds_bucket{stage="render",le="+Inf"} 4',
+        'test_seconds_sum{stage="render"} 6.05',
+        'test_seconds_count{stage="render"} 4',
+    ]
+
+
+def test_counter_and_gauge_functions():
+    counter = metrics.Counter("test_total", "Тест", ["type"])
+    counter.inc("ValueError")
+    counter.inc("ValueError", amount=2)
+    assert counter.value("ValueError") == 3
+    assert counter.render()[-1] == 'test_total{type="ValueError"} 3'
+
+    gauge = metrics.Gauge("test_depth", "Тест", ["queue"])
+    gauge.set_function(lambda: 7, "ok")
+    gauge.set_function(lambda: 1 / 0, "broken")
+    # Сломанная функция не мешает остальным
+    assert gauge.render()[2:] == ['test_depth{queue="ok"} 7']
+
+
+def test_slow_request_is_logged_with_stages(monkeypatch, caplog):
+    monkeypatch.setattr(metrics, "SLOW_REQUEST_SECONDS", 0.0)
+    monkeypatch.setattr(metrics, "SLOW_SAMPLE_RATE", 1.0)
+    timer = RequestTimer("test_slow")
+    with timer.stage("parse"):
+        pass
+    with caplog.at_level("WARNING", logger="metrics"):
+        timer.finish()
+    assert "Медленный запрос test_slow" in caplog.text and "parse=" in caplog.text
+
+
+def test_metrics_endpoint():
+    metrics.INVALID_INPUT.inc()
+    server = metrics.start_server("127.0.0.1", 0)
+    try:
+        host, port = server.server_address
+        with urllib.request.urlopen(f"http://{host}:{port}/metrics", timeout=5) as response:
+            body = response.read().decode("utf-8")
+            assert response.headers["Content-Type"].startswith("text/plain; version=0.0.4")
+        assert "# TYPE bot_invalid_input_total counter" in body
+        assert body.endswith("\n")
+        try:
+            urllib.request.urlopen(f"http://{host}:{port}/other", timeout=5)
+        except urllib.error.HTTPError as e:
+            assert e.code == 404
+        else:
+            raise AssertionError("ожидался 404")
+    finally:
+        server.shutdown()
+        server.server_close()
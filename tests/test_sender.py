@@ -0,0 +1,190 @@
+import io
+import threading
+import time
+from concurrent.futures import wait
+from types import SimpleNamespace
+
+import pytest
+import telebot
+from telebot import apihelper
+from telebot.apihelper import ApiTelegramException
+
+import metrics
+from fake_api import FakeBotAPI
+from sender import MAX_MESSAGE_LENGTH, SendScheduler, TokenBucket, split_text, utf16_length
+
+
+class _Bot:
+    """
+    Записывает отправки; первую отправку можно задержать, чтобы накопить очередь
+    """
+
+    def __init__(self, hold_first: bool = False):
+        self.sent = []
+        self.release = threading.Event()
+        if not hold_first:
+            self.release.set()
+        self._lock = threading.Lock()
+
+    def send_message(self, chat_id, text, **kwargs):
+        self.release.wait(5)
+        with self._lock:
+            self.sent.append((time.monotonic(), chat_id, text))
+        return SimpleNamespace(chat_id=chat_id, text=text)
+
+    def send_photo(self, chat_id, photo, **kwargs):
+        return self.send_message(chat_id, photo, **kwargs)
+
+
+def _too_many_requests(retry_after: int) -> ApiTelegramException:
+    return ApiTelegramException("sendMessage", None, {
+        "error_code": 429,
+        "description": f"Too Many Requests: retry after {retry_after}",
+        "parameters": {"retry_after": retry_after},
+    })
+
+
+def test_token_bucket_delay():
+    bucket = TokenBucket(rate=2, capacity=1)
+    now = bucket.updated
+    assert bucket.delay(now) == 0
+    bucket.take()
+    assert bucket.delay(now) == pytest.approx(0.5)
+    assert bucket.delay(now + 0.5) == 0
+
+
+def _held_scheduler():
+    # Единственный поток занят отправкой в чат 0 — остальное копится в очереди
+    bot = _Bot(hold_first=True)
+    scheduler = SendScheduler(bot, global_rate=100, chat_rate=100, chat_burst=100, threads=1)
+    scheduler.send_message(0, "держит поток")
+    time.sleep(0.1)
+    return bot, scheduler
+
+
+def _send_count() -> int:
+    state = metrics.STAGE_SECONDS._values.get(("send",))
+    return state[2] if state else 0
+
+
+def test_texts_to_one_chat_are_coalesced():
+    before = _send_count()
+    bot, scheduler = _held_scheduler()
+    futures = [scheduler.send_message(1, f"часть {i}") for i in range(3)]
+    bot.release.set()
+    wait(futures, timeout=5)
+    scheduler.shutdown()
+    texts = [text for _, chat_id, text in bot.sent if chat_id == 1]
+    assert texts == ["часть 0\n\nчасть 1\n\nчасть 2"]
+    assert all(future.result().text == texts[0] for future in futures)
+    # Этап "send" учитывается для каждого запроса, включая склеенные
+    assert _send_count() - before == 4
+
+
+def test_text_followed_by_photo_file():
+    bot, scheduler = _held_scheduler()
+    futures = [scheduler.send_message(1, "текст"), scheduler.send_photo(1, io.BytesIO(b"png"))]
+    bot.release.set()
+    wait(futures, timeout=5)
+    scheduler.shutdown()
+    assert all(future.exception() is None for future in futures)
+    assert [chat_id for _, chat_id, _ in bot.sent] == [0, 1, 1]
+
+
+def test_coalescing_counts_utf16_units():
+    # 1500 эмодзи — 1500 символов, но 3000 единиц UTF-16
+    text = "🔮" * 1500
+    assert len(text) * 2 + 2 < MAX_MESSAGE_LENGTH < utf16_length(text) * 2
+    bot, scheduler = _held_scheduler()
+    futures = [scheduler.send_message(1, text) for _ in range(2)]
+    bot.release.set()
+    wait(futures, timeout=5)
+    scheduler.shutdown()
+    texts = [sent for _, chat_id, sent in bot.sent if chat_id == 1]
+    assert texts == [text, text]
+
+
+def test_split_text_at_paragraphs():
+    paragraphs = [f"*Абзац {i}* " + "🔮" * 300 for i in range(20)]
+    text = "\n\n".join(paragraphs)
+    parts = split_text(text)
+    assert len(parts) > 1
+    assert all(utf16_length(part) <= MAX_MESSAGE_LENGTH for part in parts)
+    assert "\n\n".join(parts) == text
+    # Без абзацев и строк режем по символам, не разрывая эмодзи
+    parts = split_text("🔮" * 5000)
+    assert [utf16_length(part) for part in parts] == [4096, 4096, 1808]
+
+
+def test_long_text_is_sent_in_parts():
+    bot = _Bot()
+    scheduler = SendScheduler(bot, global_rate=100, chat_rate=100, chat_burst=100, threads=2)
+    text = "\n\n".join("абзац " * 100 for _ in range(20))
+    future = scheduler.send_message(1, text, reply_parameters="reply")
+    wait([future], timeout=5)
+    scheduler.shutdown()
+    texts = [sent for _, _, sent in bot.sent]
+    assert len(texts) > 1 and "\n\n".join(texts) == text
+    assert future.result().text == texts[-1]
+
+
+def test_failed_part_fails_the_reply():
+    class _Rejecting(_Bot):
+        def send_message(self, chat_id, text, **kwargs):
+            if len(self.sent) == 1:
+                raise ApiTelegramException("sendMessage", None, {"error_code": 400, "description": "Bad Request"})
+            return super().send_message(chat_id, text, **kwargs)
+
+    bot = _Rejecting()
+    scheduler = SendScheduler(bot, global_rate=100, chat_rate=100, chat_burst=100, threads=1)
+    future = scheduler.send_message(1, "\n\n".join("абзац " * 100 for _ in range(20)))
+    wait([future], timeout=5)
+    scheduler.shutdown()
+    assert isinstance(future.exception(), ApiTelegramException)
+
+
+def test_429_pauses_all_chats():
+    class _Throttled(_Bot):
+        def __init__(self):
+            super().__init__()
+            self.throttled = False
+
+        def send_message(self, chat_id, text, **kwargs):
+            if not self.throttled:
+                self.throttled = True
+                raise _too_many_requests(1)
+            return super().send_message(chat_id, text, **kwargs)
+
+    bot = _Throttled()
+    scheduler = SendScheduler(bot, global_rate=100, chat_rate=100, chat_burst=100, threads=2)
+    start = time.monotonic()
+    first = scheduler.send_message(1, "a")
+    time.sleep(0.05)
+    others = [scheduler.send_message(chat_id, "b") for chat_id in range(2, 6)]
+    wait([first] + others, timeout=5)
+    scheduler.shutdown()
+    assert first.result().chat_id == 1
+    # Ни одна отправка не ушла до конца retry_after
+    assert min(at for at, _, _ in bot.sent) - start >= 0.9
+
+
+@pytest.fixture
+def fake_api():
+    api = FakeBotAPI(port=0, global_rate=5, retry_after=1).start()
+    old_url = apihelper.API_URL
+    apihelper.API_URL = api.api_url
+    yield api
+    apihelper.API_URL = old_url
+    api.stop()
+
+
+def test_rate_limited_api_delivers_everything(fake_api):
+    bot = telebot.TeleBot("123456:TEST", threaded=False)
+    scheduler = SendScheduler(bot, global_rate=50, chat_rate=10, chat_burst=10, threads=4)
+    futures = [scheduler.send_message(chat_id, "текст") for chat_id in range(15)]
+    done, not_done = wait(futures, timeout=20)
+    scheduler.shutdown()
+    assert not not_done
+    assert all(future.exception() is None for future in done)
+    assert fake_api.throttled > 0
+    assert fake_api.calls["sendMessage"] == 15 + fake_api.throttled
@@ -0,0 +1,64 @@
+import json
+import threading
+import urllib.error
+import urllib.request
+
+from webhook import SECRET_HEADER, WebhookServer
+
+
+class _Bot:
+    def __init__(self):
+        self.update_ids = []
+        self.processed = threading.Event()
+
+    def process_new_updates(self, updates):
+        self.update_ids.extend(update.update_id for update in updates)
+        self.processed.set()
+
+
+def _post(server, payload, secret="secret") -> int:
+    host, port = server.address
+    request = urllib.request.Request(
+        f"http://{host}:{port}/webhook",
+        data=json.dumps(payload).encode("utf-8"),
+        headers={"Content-Type": "application/json", SECRET_HEADER: secret},
+    )
+    try:
+        with urllib.request.urlopen(request, timeout=5) as response:
+            return response.status
+    except urllib.error.HTTPError as e:
+        return e.code
+
+
+def _message(update_id: int) -> dict:
+    return {
+        "update_id": update_id,
+        "message": {"message_id": update_id, "date": 0, "chat": {"id": 1, "type": "private"}, "text": "15.05.1990"},
+    }
+
+
+def test_malformed_update_does_not_stop_processing():
+    bot = _Bot()
+    server = WebhookServer(bot, "127.0.0.1", 0, "/webhook", "secret", batch_interval=0.01)
+    server.start()
+    try:
+        assert _post(server, {"foo": 1}) == 400
+        assert _post(server, [1, 2]) == 400
+        # Проходит проверку формы, но ломается при разборе — отбрасывается батчером
+        assert _post(server, {"update_id": 2, "message": {"chat": None}}) == 200
+        assert _post(server, _message(3)) == 200
+        assert bot.processed.wait(5)
+    finally:
+        server.stop()
+    assert bot.update_ids == [3]
+
+
+def test_wrong_secret_is_rejected():
+    bot = _Bot()
+    server = WebhookServer(bot, "127.0.0.1", 0, "/webhook", "secret")
+    server.start()
+    try:
+        assert _post(server, _message(1), secret="wrong") == 403
+    finally:
+        server.stop()
+    assert bot.update_ids == []
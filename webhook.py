@@ -0,0 +1,154 @@
+"""
+Приём обновлений через webhook.
+
+Встроенный HTTP-сервер проверяет секретный токен, сразу отвечает 200 и кладёт
+обновление в очередь; отдельный поток собирает их пачками и передаёт боту.
+Локально можно проверить, отправив записанное обновление:
+
+    curl -X POST -H "X-Telegram-Bot-Api-Secret-Token: $WEBHOOK_SECRET" \\
+         -d @update.json http://localhost:8080/webhook
+"""
+import hmac
+import json
+import logging
+import queue
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from telebot import types
+
+logger = logging.getLogger(__name__)
+
+SECRET_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+
+_STOP = object()
+
+
+class _WebhookHandler(BaseHTTPRequestHandler):
+    server_version = "MysticBot"
+
+    def do_POST(self):
+        webhook = self.server.webhook
+        if self.path != webhook.path:
+            self._reply(404)
+            return
+
+        secret = self.headers.get(SECRET_HEADER, "")
+        if webhook.secret_token and not hmac.compare_digest(secret, webhook.secret_token):
+            self._reply(403)
+            return
+
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            payload = json.loads(self.rfile.read(length))
+        except (ValueError, json.JSONDecodeError):
+            self._reply(400)
+            return
+
+        # Записанный поток обновлений можно прислать одним списком
+        updates = payload if isinstance(payload, list) else [payload]
+        if not all(isinstance(update, dict) and isinstance(update.get("update_id"), int) for update in updates):
+            self._reply(400)
+            return
+        for update in updates:
+            if not webhook.enqueue(update):
+                # Очередь переполнена — Telegram повторит доставку позже
+                self._reply(503)
+                return
+        self._reply(200)
+
+    def _reply(self, status: int):
+        self.send_response(status)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def log_message(self, format, *args):
+        logger.debug("%s - %s", self.address_string(), format % args)
+
+
+class WebhookServer:
+    def __init__(self, bot, host: str = "0.0.0.0", port: int = 8080, path: str = "/webhook",
+                 secret_token: str = None, queue_size: int = 10000,
+                 batch_size: int = 100, batch_interval: float = 0.05):
+        self.bot = bot
+        self.path = path
+        self.secret_token = secret_token
+        self.batch_size = batch_size
+        self.batch_interval = batch_interval
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._server = ThreadingHTTPServer((host, port), _WebhookHandler)
+        self._server.daemon_threads = True
+        self._server.webhook = self
+        self._batcher = threading.Thread(target=self._batch_loop, name="webhook-batcher", daemon=True)
+
+    @property
+    def address(self) -> tuple:
+        return self._server.server_address
+
+    def enqueue(self, update: dict) -> bool:
+        try:
+            self._queue.put_nowait(update)
+            return True
+        except queue.Full:
+            return False
+
+    def depth(self) -> int:
+        return self._queue.qsize()
+
+    def _next_batch(self) -> list:
+        batch = [self._queue.get()]
+        while len(batch) < self.batch_size and batch[-1] is not _STOP:
+            try:
+                batch.append(self._queue.get(timeout=self.batch_interval))
+            except queue.Empty:
+                break
+        return batch
+
+    def _batch_loop(self):
+        while True:
+            batch = self._next_batch()
+            stop = batch[-1] is _STOP
+            updates = []
+            for update in batch:
+                if update is _STOP:
+                    continue
+                # Одно битое обновление не должно останавливать поток
+                try:
+                    updates.append(types.Update.de_json(update))
+                except Exception as e:
+                    logger.warning(f"Некорректное обновление отброшено: {e}")
+            if updates:
+                try:
+                    self.bot.process_new_updates(updates)
+                except Exception as e:
+                    logger.error(f"Ошибка обработки пачки обновлений: {e}")
+            if stop:
+                return
+
+    def set_webhook(self, url: str):
+        if not self.secret_token:
+            logger.error(
+                "WEBHOOK_SECRET не задан: любой, кто достучится до порта, может присылать обновления"
+            )
+        self.bot.set_webhook(url=url.rstrip("/") + self.path, secret_token=self.secret_token)
+
+    def serve_forever(self):
+        self._batcher.start()
+        logger.info(f"Webhook слушает {self.address[0]}:{self.address[1]}{self.path}")
+        self._server.serve_forever()
+
+    def start(self):
+        """
+        Запуск в фоновом потоке (для тестов и нагрузочных прогонов)
+        """
+        threading.Thread(target=self.serve_forever, name="webhook-server", daemon=True).start()
+
+    def stop(self):
+        """
+        Перестаёт принимать запросы и обрабатывает уже принятые обновления
+        """
+        self._server.shutdown()
+        self._server.server_close()
+        self._queue.put(_STOP)
+        if self._batcher.is_alive():
+            self._batcher.join()